@@ -1,5 +1,5 @@
 from typing import Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, UploadFile, status
 from jose import jwt, JWTError
 from pydantic import ValidationError
 from sqlalchemy.orm import Session
@@ -9,6 +9,7 @@ from app.schemas.token import TokenPayload
 from datetime import datetime
 from app.core.security import oauth2_scheme
 from app.db.base import get_mysql_db
+from app.core.image_decode import base64_to_bytes
 
 
 
@@ -50,4 +51,23 @@ def validate_refresh_token(token: str,db: Session = Depends(get_mysql_db)) -> Op
         return None
     
     user = db.query(Taikhoan).filter(Taikhoan.id == db_token.tai_khoan_id).first()
-    return user
\ No newline at end of file
+    return user
+
+
+async def read_image_input(image: Optional[str], image_file: Optional[UploadFile]) -> bytes:
+    """
+    Ảnh từ request: file binary (multipart, không bị phình 33% như base64) hoặc base64 form field
+    """
+    if image_file is not None:
+        data = await image_file.read()
+    elif image:
+        try:
+            data = base64_to_bytes(image)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        raise HTTPException(status_code=400, detail="Image is required")
+
+    if len(data) > settings.MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail="Image too large")
+    return data
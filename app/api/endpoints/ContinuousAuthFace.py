@@ -1,65 +1,28 @@
-import base64
-import io
 import tempfile
-import uuid
-from PIL import Image
+from typing import Optional
+from app.api.deps import read_image_input
+from app.core.image_decode import decode_image_bytes
 from app.schemas.continuous_auth import AuthInitRequest
 from app.services.VerificationTracker_service import global_verification_tracker
-from fastapi import APIRouter,HTTPException, Depends, Form
-from app.services.faceAuth_service import ContinuousAuthManager
-import cv2
-import numpy as np
+from fastapi import APIRouter,HTTPException, Depends, File, Form, UploadFile
+from app.services.faceAuth_service import continuous_auth_manager
 from app.db.base import get_mysql_db
 from sqlalchemy.orm import Session
 from app.services.connection_service import manager
 
 router = APIRouter()
 
-continuous_auth_manager = ContinuousAuthManager()
-def decode_base64_image(base64_string: str):
-    """Decode base64 image string to OpenCV format"""
-    try:
-        # Loại bỏ prefix data URL nếu có
-        if base64_string.startswith('data:image'):
-            base64_string = base64_string.split(',')[1]
-        
-        # Decode base64 sang bytes
-        image_data = base64.b64decode(base64_string)
-        
-        # Mở image với PIL
-        image = Image.open(io.BytesIO(image_data))
-        
-        # Convert PIL Image sang numpy array
-        image_array = np.array(image)
-        
-        # Convert sang format OpenCV (BGR)
-        if len(image_array.shape) == 2:  # Grayscale
-            opencv_image = cv2.cvtColor(image_array, cv2.COLOR_GRAY2BGR)
-        elif image_array.shape[2] == 3:  # RGB
-            opencv_image = cv2.cvtColor(image_array, cv2.COLOR_RGB2BGR)
-        elif image_array.shape[2] == 4:  # RGBA
-            opencv_image = cv2.cvtColor(image_array, cv2.COLOR_RGBA2BGR)
-        else:
-            opencv_image = image_array
-            
-        return opencv_image
-        
-    except Exception as e:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Invalid image format: {str(e)}"
-        )
-    
 @router.post("/initialize")
 async def initialize_continuous_auth(
     account_id: int = Form(...), 
     room_id: int = Form(...), 
-    baseline_image: str = Form(...), 
+    baseline_image: Optional[str] = Form(None), 
+    baseline_image_file: Optional[UploadFile] = File(None),
     db: Session = Depends(get_mysql_db),
 ):
     try:
         # Decode image
-        opencv_image = decode_base64_image(baseline_image)
+        opencv_image = decode_image_bytes(await read_image_input(baseline_image, baseline_image_file))
 
         # Initialize session
         result = await continuous_auth_manager.initialize_session(
@@ -72,6 +35,8 @@ async def initialize_continuous_auth(
             
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error initializing session: {str(e)}")
     
@@ -83,36 +48,39 @@ async def get_verification_status(account_id: int):
     return continuous_auth_manager.get_verification_status(account_id)
 
 
+@router.get("/scheduler/stats")
+async def get_scheduler_stats():
+    """
+    Metrics lịch verify: số push verify_now, tải inference và quyết định giãn interval theo risk level
+    """
+    return {
+        "scheduler": continuous_auth_manager.verification_scheduler.get_stats(),
+        "load_policy": continuous_auth_manager.interval_policy.get_stats(),
+        "session_images": manager.session_images.get_stats()
+    }
+
+
 @router.post("/verify")
 async def verify_continuous(
     account_id: int = Form(...), 
-    image_base64: str = Form(...)
+    image_base64: Optional[str] = Form(None),
+    image_file: Optional[UploadFile] = File(None)
 ):
     """
-    Verification endpoint - client gửi ảnh để verify
+    Verification endpoint - client gửi ảnh để verify (base64 hoặc file binary)
     """
     
     try:
-        # Decode verification image
-        opencv_image = decode_base64_image(image_base64)
-        if opencv_image is None:
-            raise HTTPException(status_code=400, detail="Invalid verification image format")
-        
-        # Process verification
-        result = await continuous_auth_manager.process_verification(account_id, opencv_image)
-       
-        if result["success"] is False:# and result["fraud_score"] <= 0.8:
-            session_verify_item={
-                #"similarity_score": result["similarity_score"],
-                "fraud_score": result["fraud_score"],
-                "session_id": str(uuid.uuid4()),
-                "image_base64":image_base64,
-            }
-
-            await manager.tracking_session_verify(account_id,session_verify_item)
+        # Decode + verify + tracking (chung luồng với binary frame trên WebSocket)
+        image_data = await read_image_input(image_base64, image_file)
+        result = await manager.verify_frame(account_id, image_data)
 
         return result
         
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid verification image format: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing verification: {str(e)}")
     
@@ -1,75 +1,44 @@
-import base64
-import io
-from PIL import Image 
-from app.services.faceRecognition_service import FaceRecognitionSystem
+from typing import Optional
+from app.api.deps import read_image_input
+from app.config import settings
+from app.core.image_decode import choose_reduction, decode_image_bytes
+from app.services.faceRecognition_service import face_system
+from app.services.inferenceBatcher_service import face_batcher
+from app.services.modelRegistry_service import model_registry
+from app.services.embeddingIndex_service import embedding_index
+from app.services.svmTraining_service import svm_retrainer
+from app.services.inferenceExecutor_service import inference_executor
 from app.services.embedding_service import get_person_emmbedding
-from app.services.media_service import decode_base64_image_upload, upload_image_service
+from app.services.media_service import upload_image_service, validate_image_upload
 from app.services.face_service import update_url_image
 from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, HTTPException, Form
+from fastapi import APIRouter, Depends, HTTPException, File, Form, UploadFile
 from fastapi.responses import JSONResponse
 from app.db.base import get_mysql_db
-import cv2
-import numpy as np
 from app.db.handler import mysql_executor
 
 router = APIRouter()
-face_system = FaceRecognitionSystem()
 
 
-def clean_base64_string(base64_string: str) -> str:
-    if "base64," in base64_string:
-        return base64_string.split("base64,")[1]
-    return base64_string
-
-def decode_base64_image(base64_string: str):
-    """Decode base64 image string to OpenCV format"""
-    try:
-        # Loại bỏ prefix data URL nếu có
-        if base64_string.startswith('data:image'):
-            base64_string = base64_string.split(',')[1]
-        
-        # Decode base64 sang bytes
-        image_data = base64.b64decode(base64_string)
-        
-        # Mở image với PIL
-        image = Image.open(io.BytesIO(image_data))
-        
-        # Convert PIL Image sang numpy array
-        image_array = np.array(image)
-        
-        # Convert sang format OpenCV (BGR)
-        if len(image_array.shape) == 2:  # Grayscale
-            opencv_image = cv2.cvtColor(image_array, cv2.COLOR_GRAY2BGR)
-        elif image_array.shape[2] == 3:  # RGB
-            opencv_image = cv2.cvtColor(image_array, cv2.COLOR_RGB2BGR)
-        elif image_array.shape[2] == 4:  # RGBA
-            opencv_image = cv2.cvtColor(image_array, cv2.COLOR_RGBA2BGR)
-        else:
-            opencv_image = image_array
-            
-        return opencv_image
-        
-    except Exception as e:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Invalid image format: {str(e)}"
-        )
-    
 @router.post("/detect-faces")
-async def detect_faces_endpoint(image: str = Form(...)):
+async def detect_faces_endpoint(
+    image: Optional[str] = Form(None),
+    image_file: Optional[UploadFile] = File(None)
+    ):
     """Real-time face detection endpoint for auto-capture"""
     try:
-        # Decode image
-        opencv_image = decode_base64_image(image)
+        # Decode image - chỉ cần box nên decode JPEG ở độ phân giải giảm (vẫn >= kích thước detector)
+        image_data = await read_image_input(image, image_file)
+        reduction = choose_reduction(image_data, settings.DETECTION_INFERENCE_SIZE)
+        opencv_image = decode_image_bytes(image_data, reduction)
         
-        # Detect faces with YOLO
-        faces = face_system.detect_faces(opencv_image)
+        # Detect faces with YOLO (micro-batched với các request khác), min_face_size theo độ phân giải gốc
+        faces = await face_batcher.detect(opencv_image, pixel_scale=reduction)
         
-        # Format response for frontend
+        # Format response for frontend (box theo độ phân giải gốc)
         face_data = []
         for face in faces:
-            x1, y1, x2, y2 = face['bbox']
+            x1, y1, x2, y2 = (coord * reduction for coord in face['bbox'])
             face_data.append({
                 'bbox': {
                     'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2,
@@ -84,6 +53,8 @@ async def detect_faces_endpoint(image: str = Form(...)):
             "count": len(face_data)
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         return JSONResponse(
             content={"success": False, "error": f"Detection failed: {str(e)}"}, 
@@ -95,19 +66,20 @@ async def detect_faces_endpoint(image: str = Form(...)):
 async def register_face_endpoint(
     maso: str = Form(...), 
     db: Session = Depends(get_mysql_db),
-    image: str = Form(...)
+    image: Optional[str] = Form(None),
+    image_file: Optional[UploadFile] = File(None)
     ):
     """Register a new face"""
     try:
-        # Decode image
-        opencv_image = decode_base64_image(image)
+        # Decode image (bytes dùng lại cho upload, không decode base64 lần hai)
+        image_data = await read_image_input(image, image_file)
+        opencv_image = decode_image_bytes(image_data)
         
-        # Register face
-        result = face_system.register_face(maso, opencv_image, db)
+        # Register face (chạy trên inference executor)
+        result = await inference_executor.run(face_system.register_face, maso, opencv_image, db)
         
         if result["success"]:
-            clean_image = clean_base64_string(image)
-            image_data, image_format = decode_base64_image_upload(clean_image)
+            image_data, image_format = validate_image_upload(image_data)
             image_path = upload_image_service(image_data,image_format)
             result_update =  update_url_image(mysql_executor,maso,image_path)
 
@@ -118,6 +90,8 @@ async def register_face_endpoint(
         else:
             return JSONResponse(content=result, status_code=400)
             
+    except HTTPException:
+        raise
     except Exception as e:
         return JSONResponse(
             content={"success": False, "message": f"Registration failed: {str(e)}"}, 
@@ -127,27 +101,61 @@ async def register_face_endpoint(
 @router.post("/authenticate-face")
 async def authenticate_face_endpoint(
     db: Session = Depends(get_mysql_db),
-    image: str = Form(...)
+    image: Optional[str] = Form(None),
+    image_file: Optional[UploadFile] = File(None)
     ):
     """Authenticate face"""
     try:
         # Decode image
-        opencv_image = decode_base64_image(image)
+        opencv_image = decode_image_bytes(await read_image_input(image, image_file))
         
-        # Authenticate face
-        result = face_system.authenticate_face(db,opencv_image)
+        # Detect + embed qua micro-batcher, sau đó SVM + embedding verification
+        faces = await face_batcher.detect(opencv_image)
+        embeddings = await face_batcher.embed([face['face_image'] for face in faces])
+        result = await inference_executor.run(face_system.authenticate_detected, db, faces, embeddings)
         
         if result["success"]:
             return JSONResponse(content=result, status_code=200)
         else:
             return JSONResponse(content=result, status_code=401)
             
+    except HTTPException:
+        raise
     except Exception as e:
         return JSONResponse(
             content={"success": False, "message": f"Authentication failed: {str(e)}"}, 
             status_code=500
         )
 
+@router.get("/inference/stats")
+async def get_inference_stats():
+    """Queue depth / throughput của inference executor và micro-batcher"""
+    return {
+        "executor": inference_executor.get_stats(),
+        "batcher": face_batcher.get_stats()
+    }
+
+@router.get("/models")
+async def get_models_info():
+    """Trạng thái load và bộ nhớ của từng model trong worker"""
+    return {
+        **model_registry.memory_report(),
+        "embedding_index": embedding_index.get_stats()
+    }
+
+@router.get("/svm")
+async def get_svm_status():
+    """Version SVM đang active và kết quả retrain gần nhất"""
+    return svm_retrainer.get_status()
+
+@router.post("/svm/retrain")
+async def retrain_svm():
+    """Retrain SVM ngay (chạy ở process riêng, hot swap nếu đạt holdout)"""
+    try:
+        return await svm_retrainer.retrain()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"SVM retraining failed: {str(e)}")
+
 @router.get("/users")
 async def get_users():
     """Get all registered users"""
@@ -3,6 +3,7 @@ from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 import asyncio
 import json
 from app.services.connection_service import manager
+from app.core.message_codec import decode_message
 router = APIRouter()
 from app.db.base import db_handler
 
@@ -24,14 +25,24 @@ async def websocket_endpoint(websocket: WebSocket, mssv: str):
             while True:
                 try:
                     # Timeout mechanism để detect dead connections
-                    data = await asyncio.wait_for(
-                        websocket.receive_text(), 
+                    received = await asyncio.wait_for(
+                        websocket.receive(), 
                         timeout=30.0
                     )
                     
+                    if received["type"] == "websocket.disconnect":
+                        raise WebSocketDisconnect(received.get("code", 1000))
+                    
+                    # Binary frame (header + JPEG) -> continuous verification (chạy trong task riêng, không chặn loop)
+                    if received.get("bytes") is not None:
+                        await manager.handle_binary_message(mssv, received["bytes"])
+                        continue
+                    
+                    data = received.get("text")
+                    
                     # Parse và validate message
                     try:
-                        message = json.loads(data)
+                        message = decode_message(data)
                         print(f"📨 Message from {mssv}: {message}")
                     except json.JSONDecodeError:
                         print(f"⚠️ Invalid JSON from {mssv}")
@@ -25,6 +25,100 @@ class Settings(BaseSettings):
     ALLOWED_FORMATS = {'jpeg', 'jpg', 'png', 'gif', 'webp', 'bmp'}
     MAX_FILE_SIZE = 5 * 1024 * 1024 
 
+    # Face embedding storage (float32 | float16)
+    EMBEDDING_STORAGE_DTYPE: str = os.getenv("EMBEDDING_STORAGE_DTYPE", "float32")
+
+    # Embedding index: exact (quét toàn bộ) | ivf (ANN cho tập enroll lớn)
+    EMBEDDING_INDEX_BACKEND: str = os.getenv("EMBEDDING_INDEX_BACKEND", "exact")
+    # Số cluster IVF (0 = tự chọn ~ sqrt(N)) và số cluster quét mỗi query (recall <-> latency)
+    EMBEDDING_IVF_NLIST: int = int(os.getenv("EMBEDDING_IVF_NLIST", "0"))
+    EMBEDDING_IVF_NPROBE: int = int(os.getenv("EMBEDDING_IVF_NPROBE", "8"))
+    # Dưới ngưỡng này vẫn quét exact (nhanh và chính xác hơn với tập nhỏ)
+    EMBEDDING_IVF_MIN_SIZE: int = int(os.getenv("EMBEDDING_IVF_MIN_SIZE", "10000"))
+    # Thư mục snapshot index dùng chung giữa các worker qua mmap ("" = mỗi worker tự load)
+    EMBEDDING_INDEX_DIR: str = os.getenv("EMBEDDING_INDEX_DIR", "data/embedding_index")
+    # Khoảng tối thiểu (giây) giữa hai lần publish snapshot sau khi có thay đổi incremental
+    EMBEDDING_SHARED_PUBLISH_INTERVAL: float = float(os.getenv("EMBEDDING_SHARED_PUBLISH_INTERVAL", "30"))
+    # Journal thay đổi embedding dùng chung giữa các worker ("" = chỉ trong process)
+    EMBEDDING_CHANGELOG_PATH: str = os.getenv("EMBEDDING_CHANGELOG_PATH", "data/embedding_changes.log")
+    EMBEDDING_CHANGELOG_MAX_BYTES: int = int(os.getenv("EMBEDDING_CHANGELOG_MAX_BYTES", str(8 * 1024 * 1024)))
+
+    # YOLO face detection: cạnh dài tối đa của ảnh đưa vào detector (box được map lại về độ phân giải gốc),
+    # 0 = không thu nhỏ (YOLO dùng imgsz mặc định, upload decode ở độ phân giải gốc)
+    DETECTION_INFERENCE_SIZE: int = int(os.getenv("DETECTION_INFERENCE_SIZE", "640"))
+    # Padding quanh box trước đó khi detect theo ROI (tỉ lệ theo kích thước box)
+    DETECTION_ROI_PADDING: float = float(os.getenv("DETECTION_ROI_PADDING", "0.5"))
+    # Continuous auth: cứ N frame (kể cả frame tracked) detect toàn frame một lần (phát hiện người thứ hai),
+    # 0 = luôn toàn frame (tắt cả tracking)
+    DETECTION_ROI_FULL_FRAME_EVERY: int = int(os.getenv("DETECTION_ROI_FULL_FRAME_EVERY", "5"))
+
+    # Face tracking continuous auth: số frame liên tiếp tối đa bỏ qua YOLO (0 = tắt), ngưỡng correlation của signature
+    TRACK_MAX_SKIP: int = int(os.getenv("TRACK_MAX_SKIP", "3"))
+    TRACK_MIN_CORRELATION: float = float(os.getenv("TRACK_MIN_CORRELATION", "0.9"))
+
+    # Micro-batching inference (YOLO + FaceNet) giữa các request
+    INFERENCE_MAX_BATCH_SIZE: int = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "16"))
+    INFERENCE_MAX_WAIT_MS: float = float(os.getenv("INFERENCE_MAX_WAIT_MS", "5"))
+
+    # Inference executor (0 = theo số CPU core)
+    INFERENCE_MAX_WORKERS: int = int(os.getenv("INFERENCE_MAX_WORKERS", "0"))
+    INFERENCE_MAX_CONCURRENCY: int = int(os.getenv("INFERENCE_MAX_CONCURRENCY", "0"))
+    # Số job gần nhất dùng để tính latency percentile (p50 / p95)
+    INFERENCE_LATENCY_WINDOW: int = int(os.getenv("INFERENCE_LATENCY_WINDOW", "512"))
+
+    # Load sẵn models khi worker khởi động (mặc định lazy ở request đầu tiên)
+    MODEL_WARMUP: bool = os.getenv("MODEL_WARMUP", "false").lower() == "true"
+
+    # SVM retraining nền: thư mục model có version, chu kỳ kiểm tra (giây, 0 = tắt), holdout
+    SVM_MODEL_DIR: str = os.getenv("SVM_MODEL_DIR", "data/svm")
+    SVM_RETRAIN_INTERVAL: float = float(os.getenv("SVM_RETRAIN_INTERVAL", "600"))
+    SVM_RETRAIN_HOLDOUT: float = float(os.getenv("SVM_RETRAIN_HOLDOUT", "0.2"))
+    SVM_RETRAIN_MIN_ACCURACY: float = float(os.getenv("SVM_RETRAIN_MIN_ACCURACY", "0.9"))
+    # Holdout tối thiểu (mẫu) để được activate; class 1 mẫu không vào holdout
+    SVM_RETRAIN_MIN_HOLDOUT: int = int(os.getenv("SVM_RETRAIN_MIN_HOLDOUT", "10"))
+    # Platt calibration: tỉ lệ holdout đúng với xác suất >= SVM_RETRAIN_MIN_CONFIDENCE (= ngưỡng SVM khi login)
+    SVM_RETRAIN_MIN_CONFIDENCE: float = float(os.getenv("SVM_RETRAIN_MIN_CONFIDENCE", "0.8"))
+    SVM_RETRAIN_MIN_CONFIDENT_RATE: float = float(os.getenv("SVM_RETRAIN_MIN_CONFIDENT_RATE", "0.5"))
+    SVM_KEEP_VERSIONS: int = int(os.getenv("SVM_KEEP_VERSIONS", "3"))
+
+    # Continuous auth: số embedding verify gần đây giữ lại để chịu drift (0 = chỉ so với baseline)
+    # Embedding gần đây chỉ nới ngưỡng khi frame vẫn trong suspicious_threshold so với baseline
+    CONTINUOUS_AUTH_RECENT_EMBEDDINGS: int = int(os.getenv("CONTINUOUS_AUTH_RECENT_EMBEDDINGS", "0"))
+    # Verifier backend: facenet (dùng chung YOLO + FaceNet) | deepface (VGG-Face)
+    CONTINUOUS_AUTH_VERIFIER: str = os.getenv("CONTINUOUS_AUTH_VERIFIER", "facenet")
+    # Server push verify_now qua WebSocket khi tới hạn (thay cho client polling /status)
+    VERIFICATION_PUSH_ENABLED: bool = os.getenv("VERIFICATION_PUSH_ENABLED", "true").lower() == "true"
+    # Jitter ngẫu nhiên ±tỉ lệ của interval để rải tải khi cả phòng bắt đầu cùng lúc
+    VERIFICATION_SCHEDULE_JITTER: float = float(os.getenv("VERIFICATION_SCHEDULE_JITTER", "0.15"))
+    # Ngừng nhắc lại sau N lần verify_now liên tiếp không gửi được (client offline / socket ở worker khác), 0 = không giới hạn
+    VERIFICATION_PUSH_MAX_MISSES: int = int(os.getenv("VERIFICATION_PUSH_MAX_MISSES", "5"))
+    # Load-aware interval: ngưỡng quá tải theo queue depth inference và p95 latency (ms)
+    VERIFICATION_LOAD_QUEUE_TARGET: int = int(os.getenv("VERIFICATION_LOAD_QUEUE_TARGET", "32"))
+    VERIFICATION_LOAD_P95_TARGET_MS: float = float(os.getenv("VERIFICATION_LOAD_P95_TARGET_MS", "500"))
+    # Hệ số giãn interval tối đa cho session rủi ro thấp khi quá tải (1 = tắt)
+    VERIFICATION_LOAD_MAX_STRETCH: float = float(os.getenv("VERIFICATION_LOAD_MAX_STRETCH", "3.0"))
+
+    # Ảnh verify thất bại giữ lại cho giáo viên xem: budget RAM, số ảnh mỗi account, TTL (giây)
+    SESSION_IMAGE_MAX_BYTES: int = int(os.getenv("SESSION_IMAGE_MAX_BYTES", str(64 * 1024 * 1024)))
+    SESSION_IMAGE_MAX_PER_ACCOUNT: int = int(os.getenv("SESSION_IMAGE_MAX_PER_ACCOUNT", "10"))
+    SESSION_IMAGE_TTL: float = float(os.getenv("SESSION_IMAGE_TTL", "14400"))
+    SESSION_IMAGE_JPEG_QUALITY: int = int(os.getenv("SESSION_IMAGE_JPEG_QUALITY", "85"))
+    # Disk cache cho ảnh bị evict khỏi RAM (để trống = tắt)
+    SESSION_IMAGE_SPILL_DIR: str = os.getenv("SESSION_IMAGE_SPILL_DIR", "")
+    SESSION_IMAGE_SPILL_MAX_BYTES: int = int(os.getenv("SESSION_IMAGE_SPILL_MAX_BYTES", str(512 * 1024 * 1024)))
+    # Số lần verify thất bại gần nhất giữ lại mỗi account (chọn session gửi giáo viên)
+    SESSION_VERIFY_HISTORY: int = int(os.getenv("SESSION_VERIFY_HISTORY", "30"))
+
+    # WebSocket outbound: số message chờ gửi tối đa mỗi connection, timeout mỗi lần gửi (giây)
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+    WS_SEND_TIMEOUT: float = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+    # Client chậm (queue đầy): drop | coalesce | disconnect
+    WS_SLOW_CONSUMER_POLICY: str = os.getenv("WS_SLOW_CONSUMER_POLICY", "coalesce")
+    # JSON encoder cho message WebSocket: auto (orjson nếu đã cài) | orjson | json
+    WS_JSON_ENCODER: str = os.getenv("WS_JSON_ENCODER", "auto")
+    # Gom room_count_update: tối đa một update mỗi room trong cửa sổ này (ms, 0 = gửi ngay mỗi lần)
+    ROOM_COUNT_COALESCE_MS: float = float(os.getenv("ROOM_COUNT_COALESCE_MS", "250"))
+
 
     # CORS configuration
     @property
@@ -0,0 +1,61 @@
+# Định dạng nhị phân cho embedding lưu trong cột nhandien.embedding_vector
+#
+# Layout (little-endian):
+#   magic   4 bytes  b"EMBV"
+#   version uint8
+#   dtype   uint8    0 = float32, 1 = float16
+#   dim     uint16
+#   data    dim * itemsize bytes
+import json
+import struct
+from typing import Union
+
+import numpy as np
+
+EMBEDDING_MAGIC = b"EMBV"
+EMBEDDING_FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sBBH")
+
+_DTYPE_TO_CODE = {"float32": 0, "float16": 1}
+_CODE_TO_DTYPE = {0: np.dtype("<f4"), 1: np.dtype("<f2")}
+
+
+def is_binary_embedding(value: Union[bytes, bytearray, memoryview, str, None]) -> bool:
+    """Kiểm tra value có phải embedding nhị phân (có header) hay không"""
+    if not isinstance(value, (bytes, bytearray, memoryview)):
+        return False
+    return bytes(value[:len(EMBEDDING_MAGIC)]) == EMBEDDING_MAGIC
+
+
+def encode_embedding(embedding: np.ndarray, dtype: str = "float32") -> bytes:
+    """Encode embedding 1 chiều thành bytes: header + raw little-endian float"""
+    if dtype not in _DTYPE_TO_CODE:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+    code = _DTYPE_TO_CODE[dtype]
+    vector = np.ascontiguousarray(np.asarray(embedding).ravel(), dtype=_CODE_TO_DTYPE[code])
+    return HEADER.pack(EMBEDDING_MAGIC, EMBEDDING_FORMAT_VERSION, code, vector.shape[0]) + vector.tobytes()
+
+
+def decode_embedding(value: Union[bytes, bytearray, memoryview, str]) -> np.ndarray:
+    """
+    Decode embedding từ database:
+    - Định dạng nhị phân: np.frombuffer trực tiếp trên buffer (float32 không copy, read-only)
+    - Dữ liệu JSON cũ (chưa migrate): fallback json.loads
+    """
+    if is_binary_embedding(value):
+        _, version, code, dim = HEADER.unpack_from(value)
+        if version != EMBEDDING_FORMAT_VERSION:
+            raise ValueError(f"Unsupported embedding format version: {version}")
+        if code not in _CODE_TO_DTYPE:
+            raise ValueError(f"Unsupported embedding dtype code: {code}")
+
+        vector = np.frombuffer(value, dtype=_CODE_TO_DTYPE[code], count=dim, offset=HEADER.size)
+        if code != 0:
+            # float16 phải upcast để tính toán - đây là copy duy nhất
+            vector = vector.astype(np.float32)
+        return vector
+
+    if isinstance(value, (bytearray, memoryview)):
+        value = bytes(value)
+    return np.asarray(json.loads(value), dtype=np.float32)
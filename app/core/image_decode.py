@@ -0,0 +1,115 @@
+# Decode ảnh upload (base64 / binary) thẳng sang mảng BGR cho OpenCV
+#
+#   bytes -> np.frombuffer (không copy) -> cv2.imdecode (một lần decode, ra BGR luôn)
+#   thay cho base64 -> PIL -> np.array -> cv2.cvtColor (nhiều bản copy full-frame)
+import base64
+import binascii
+import struct
+from typing import Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+ImageBytes = Union[bytes, bytearray, memoryview]
+
+# Hệ số thu nhỏ được hỗ trợ bởi IMREAD_REDUCED_* (decode JPEG ở 1/2, 1/4, 1/8 độ phân giải)
+_REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def strip_data_url(value: str) -> str:
+    """Bỏ prefix 'data:image/...;base64,' nếu có"""
+    if "base64," in value:
+        return value.split("base64,", 1)[1]
+    return value
+
+
+def base64_to_bytes(value: str) -> bytes:
+    """Base64 (có thể có data URL prefix) -> bytes"""
+    try:
+        return base64.b64decode(strip_data_url(value))
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid base64 image: {e}")
+
+
+def decode_image_bytes(data: ImageBytes, reduction: int = 1) -> np.ndarray:
+    """
+    Decode ảnh (JPEG / PNG / ...) sang BGR uint8
+    reduction: 1 | 2 | 4 | 8 - decode thẳng ở độ phân giải nhỏ hơn (box phải nhân lại với reduction)
+    """
+    if reduction not in _REDUCED_FLAGS:
+        raise ValueError(f"Unsupported decode reduction: {reduction}")
+
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if buffer.size == 0:
+        raise ValueError("Empty image data")
+
+    image = cv2.imdecode(buffer, _REDUCED_FLAGS[reduction])
+    if image is None:
+        raise ValueError("Invalid image format")
+    return image
+
+
+def decode_base64_image(value: str, reduction: int = 1) -> np.ndarray:
+    """Base64 string -> BGR array"""
+    return decode_image_bytes(base64_to_bytes(value), reduction)
+
+
+def is_jpeg(data: ImageBytes) -> bool:
+    return bytes(data[:3]) == b"\xff\xd8\xff"
+
+
+def encode_jpeg(image: np.ndarray, quality: int = 85) -> bytes:
+    """BGR array -> JPEG bytes"""
+    ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buffer.tobytes()
+
+
+def image_dimensions(data: ImageBytes) -> Optional[Tuple[int, int]]:
+    """(width, height) đọc từ header JPEG / PNG mà không decode, None nếu không xác định được"""
+    data = memoryview(data)
+
+    # PNG: IHDR ngay sau signature
+    if len(data) >= 24 and data[:8] == b"\x89PNG\r\n\x1a\n":
+        width, height = struct.unpack(">II", data[16:24])
+        return width, height
+
+    # JPEG: duyệt các marker tới SOFn
+    if len(data) >= 4 and data[:2] == b"\xff\xd8":
+        offset = 2
+        while offset + 9 < len(data):
+            if data[offset] != 0xFF:
+                return None
+            marker = data[offset + 1]
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                offset += 2
+                continue
+            length = struct.unpack(">H", data[offset + 2:offset + 4])[0]
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">HH", data[offset + 5:offset + 9])
+                return width, height
+            offset += 2 + length
+
+    return None
+
+
+def choose_reduction(data: ImageBytes, target_size: int) -> int:
+    """Hệ số IMREAD_REDUCED lớn nhất mà cạnh dài sau khi thu nhỏ vẫn >= target_size (chỉ với JPEG)"""
+    if not target_size or not is_jpeg(data):
+        return 1
+
+    dimensions = image_dimensions(data)
+    if dimensions is None:
+        return 1
+
+    longest = max(dimensions)
+    for reduction in (8, 4, 2):
+        if longest // reduction >= target_size:
+            return reduction
+    return 1
@@ -0,0 +1,43 @@
+# Encode / decode JSON message cho WebSocket
+#
+#   Mỗi message outbound được encode MỘT lần thành text frame (str), mọi recipient dùng chung
+#   orjson (nếu cài) nhanh hơn json.dumps nhiều lần; WS_JSON_ENCODER = auto | orjson | json
+#   Luôn gửi text frame: binary frame phía client được dành cho ảnh (send_session_image)
+import json
+from typing import Any, Union
+
+from app.config import settings
+
+try:
+    import orjson
+except ImportError:  # orjson là optional, fallback về json chuẩn
+    orjson = None
+
+
+def _use_orjson(encoder: str) -> bool:
+    encoder = (encoder or "auto").strip().lower()
+    if encoder == "orjson" and orjson is None:
+        raise ImportError("WS_JSON_ENCODER=orjson but orjson is not installed")
+    if encoder not in ("auto", "orjson", "json"):
+        raise ValueError(f"Unknown WS_JSON_ENCODER: {encoder}")
+    return orjson is not None and encoder != "json"
+
+
+USE_ORJSON = _use_orjson(settings.WS_JSON_ENCODER)
+
+
+def encode_message(message: Any) -> str:
+    """dict -> JSON text frame"""
+    if USE_ORJSON:
+        return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(message)
+
+
+def decode_message(data: Union[str, bytes, memoryview]) -> Any:
+    """JSON text / bytes -> object, lỗi format raise ValueError (json.JSONDecodeError / orjson.JSONDecodeError)"""
+    if USE_ORJSON:
+        return orjson.loads(bytes(data) if isinstance(data, memoryview) else data)
+    if isinstance(data, memoryview):
+        data = bytes(data)
+    return json.loads(data)
+
@@ -0,0 +1,105 @@
+import argparse
+import logging
+from sqlalchemy import text
+from app.config import settings
+from app.core.embedding_codec import decode_embedding, encode_embedding, is_binary_embedding
+from app.db.base import db_handler
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TEXT_TYPES = {"text", "tinytext", "mediumtext", "longtext", "varchar"}
+
+
+def ensure_blob_column(db) -> None:
+    """
+    Đổi cột nhandien.embedding_vector từ TEXT sang BLOB (nếu chưa đổi)
+    JSON cũ chỉ gồm ký tự ASCII nên được giữ nguyên từng byte khi đổi kiểu
+    """
+    column_type = db.execute(text("""
+        SELECT DATA_TYPE FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+          AND TABLE_NAME = 'nhandien'
+          AND COLUMN_NAME = 'embedding_vector'
+    """)).scalar()
+
+    if column_type is None:
+        raise RuntimeError("Column nhandien.embedding_vector không tồn tại")
+
+    if column_type.lower() in TEXT_TYPES:
+        logger.info(f"Đổi kiểu cột embedding_vector: {column_type} -> BLOB...")
+        db.execute(text("ALTER TABLE nhandien MODIFY embedding_vector BLOB NOT NULL"))
+        db.commit()
+        logger.info("✅ Đã đổi kiểu cột embedding_vector")
+    else:
+        logger.info(f"ℹ️  Cột embedding_vector đã là {column_type}, bỏ qua ALTER")
+
+
+def migrate_embeddings(batch_size: int = 500, dtype: str = "float32", dry_run: bool = False) -> int:
+    """
+    Chuyển toàn bộ embedding JSON sang định dạng nhị phân, xử lý theo batch
+    Chạy lại nhiều lần vẫn an toàn: dòng đã ở dạng nhị phân được bỏ qua
+    """
+    converted = 0
+    failed = 0
+    last_id = 0
+
+    with db_handler.get_session("mysql") as db:
+        if not dry_run:
+            ensure_blob_column(db)
+
+        while True:
+            rows = db.execute(
+                text("""
+                    SELECT id, embedding_vector FROM nhandien
+                    WHERE id > :last_id
+                    ORDER BY id
+                    LIMIT :batch_size
+                """),
+                {"last_id": last_id, "batch_size": batch_size}
+            ).fetchall()
+
+            if not rows:
+                break
+
+            last_id = rows[-1][0]
+            updates = []
+
+            for row_id, embedding_vector in rows:
+                if is_binary_embedding(embedding_vector):
+                    continue
+                try:
+                    vector = decode_embedding(embedding_vector)
+                    updates.append({"id": row_id, "embedding_vector": encode_embedding(vector, dtype)})
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"❌ Không thể chuyển embedding id={row_id}: {e}")
+
+            if updates and not dry_run:
+                try:
+                    db.execute(
+                        text("UPDATE nhandien SET embedding_vector = :embedding_vector WHERE id = :id"),
+                        updates
+                    )
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"❌ Lỗi cập nhật batch đến id={last_id}: {e}")
+                    raise
+
+            converted += len(updates)
+            logger.info(f"Đã xử lý đến id={last_id} ({converted} dòng chuyển đổi)")
+
+    action = "Sẽ chuyển" if dry_run else "Đã chuyển"
+    logger.info(f"✅ {action} {converted} embedding sang dạng nhị phân ({dtype}), lỗi: {failed}")
+    return converted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate nhandien.embedding_vector từ JSON sang nhị phân")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dtype", choices=["float32", "float16"], default=settings.EMBEDDING_STORAGE_DTYPE)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    migrate_embeddings(args.batch_size, args.dtype, args.dry_run)
@@ -8,6 +8,10 @@ from fastapi.responses import FileResponse
 from pathlib import Path
 from app.config import settings
 from app.middlewares.security import SecurityHeadersMiddleware
+from app.services.inferenceExecutor_service import inference_executor
+from app.services.modelRegistry_service import model_registry
+from app.services.svmTraining_service import svm_retrainer
+from app.services.verificationScheduler_service import verification_scheduler
 from fastapi import FastAPI
 from pathlib import Path as PathlibPath
 
@@ -50,6 +54,25 @@ app.include_router(api_router, prefix=settings.API_V1_STR)
 #In clude Websocket router
 app.include_router(websocket_router,prefix=settings.SOCKET_V1_STR)
 
+@app.on_event("startup")
+async def warm_up_models():
+    # Chạy sau khi gunicorn fork worker - mỗi worker load models một lần
+    if settings.MODEL_WARMUP:
+        await inference_executor.run(model_registry.warm_up)
+
+
+@app.on_event("startup")
+async def start_svm_retraining():
+    # Vòng kiểm tra retrain SVM nền (file lock -> chỉ một worker train tại một thời điểm)
+    svm_retrainer.start()
+
+
+@app.on_event("startup")
+async def start_verification_scheduler():
+    # Push verify_now qua WebSocket theo lịch của từng session continuous auth
+    verification_scheduler.start()
+
+
 @app.get("/api/health")
 def health_check():
     return {"status": "healthy", "environment": settings.ENVIRONMENT}
@@ -1,6 +1,6 @@
 from typing import List, Optional
 
-from sqlalchemy import DateTime, Double, Enum, Float, ForeignKeyConstraint, Index, Integer, JSON, String, TIMESTAMP, Text, text
+from sqlalchemy import DateTime, Double, Enum, Float, ForeignKeyConstraint, Index, Integer, JSON, LargeBinary, String, TIMESTAMP, Text, text
 from sqlalchemy.dialects.mysql import TINYINT
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 import datetime
@@ -129,7 +129,7 @@ class Nhandien(Base):
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    embedding_vector: Mapped[str] = mapped_column(Text)
+    embedding_vector: Mapped[bytes] = mapped_column(LargeBinary)  # app.core.embedding_codec
     nguoi_dung_id: Mapped[Optional[str]] = mapped_column(String(20))
     duong_dan_anh: Mapped[Optional[str]] = mapped_column(Text)
     danh_gia: Mapped[Optional[decimal.Decimal]] = mapped_column(Double(asdecimal=True))
@@ -1,12 +1,49 @@
 import base64
+import uuid
 from datetime import datetime
+from app.config import settings
+from app.core.image_decode import decode_image_bytes, encode_jpeg, is_jpeg
+from app.core.message_codec import decode_message, encode_message
 from app.services.VerificationTracker_service import global_verification_tracker
+from app.services.faceAuth_service import continuous_auth_manager
+from app.services.sessionImageStore_service import session_image_store
+from app.services.verificationScheduler_service import verification_scheduler
+from app.services.outboundQueue_service import OutboundQueue
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.websockets import WebSocketState
-from typing import Dict, Set, List
+from typing import Deque, Dict, Set, List, Optional, Tuple
+from collections import deque
 import json
 import asyncio
 
+# Binary frame client -> server (cùng layout với send_session_image):
+#   [4 byte big-endian: độ dài header][header JSON utf-8][payload (JPEG bytes)]
+# Header: {"type": "verify_frame", "request_id": "..."}
+FRAME_HEADER_LENGTH_SIZE = 4
+MAX_FRAME_HEADER_SIZE = 1024
+
+
+def parse_binary_frame(data: bytes) -> Tuple[dict, memoryview]:
+    """Tách header + payload của binary frame (payload là view, không copy)"""
+    if len(data) < FRAME_HEADER_LENGTH_SIZE:
+        raise ValueError("Binary frame too short")
+
+    header_length = int.from_bytes(data[:FRAME_HEADER_LENGTH_SIZE], 'big')
+    header_end = FRAME_HEADER_LENGTH_SIZE + header_length
+    if header_length > MAX_FRAME_HEADER_SIZE or header_end > len(data):
+        raise ValueError("Invalid binary frame header length")
+
+    header = decode_message(data[FRAME_HEADER_LENGTH_SIZE:header_end])
+    if not isinstance(header, dict):
+        raise ValueError("Binary frame header must be a JSON object")
+
+    return header, memoryview(data)[header_end:]
+
+# Frame cố định encode sẵn một lần
+PONG_FRAME = encode_message({"type": "pong"})
+HEARTBEAT_FRAME = encode_message({"type": "heartbeat"})
+
+
 class ConnectionManager:
     def __init__(self):
         # Unified connections với mssv làm primary key
@@ -19,6 +56,11 @@ class ConnectionManager:
         self.mssv_to_account: Dict[str, int] = {}           # mssv -> account_id
         self.connection_tasks: Dict[str, asyncio.Task] = {} # mssv -> Task
 
+        # Reverse indexes (tra cứu O(1), cập nhật cùng lúc với map chính)
+        self.account_to_mssv: Dict[int, str] = {}           # account_id -> mssv
+        self.mssv_rooms: Dict[str, Set[int]] = {}           # mssv -> set of room_id
+        self.room_teachers: Dict[int, str] = {}             # room_id -> mssv giáo viên của quiz đang chạy
+
         # Quiz control state
         self.quiz_sessions: Dict[int, dict] = {}   # quiz_id -> session info
 
@@ -26,8 +68,21 @@ class ConnectionManager:
         self.quiz_submissions: Dict[int, Set[str]] = {}  # quiz_id -> set of submitted mssv
 
         #Session Verify
-        self.session_verify: Dict[int, List[dict]] = {} #account_id -> session verify
-        self.session_images = {}
+        self.session_verify: Dict[int, Deque[dict]] = {} #account_id -> các lần verify thất bại gần nhất
+        self.session_verify_counts: Dict[int, int] = {} #account_id -> tổng số lần verify thất bại
+        self.session_images = session_image_store        #session_id -> JPEG bytes (bounded, LRU / TTL)
+
+        # Outbound: mỗi connection một queue + writer task, client chậm không chặn broadcast
+        self.outbound: Dict[str, OutboundQueue] = {}     # mssv -> OutboundQueue
+
+        # Verify frame qua WebSocket chạy trong task riêng (tối đa một frame / client), receive loop không bị chặn
+        self.verify_tasks: Dict[str, asyncio.Task] = {}  # mssv -> task verify đang xử lý
+
+        # Room count coalescing: tối đa một update mỗi room trong mỗi cửa sổ ROOM_COUNT_COALESCE_MS
+        self.room_count_window = max(0.0, settings.ROOM_COUNT_COALESCE_MS) / 1000.0
+        self._room_count_sent_at: Dict[int, float] = {}     # room_id -> thời điểm gửi gần nhất (loop time)
+        self._room_count_pending: Dict[int, asyncio.Task] = {} # room_id -> task gửi cuối cửa sổ
+        self.room_count_stats = {"sent": 0, "coalesced": 0}
 
         
     async def connect(self, websocket: WebSocket, mssv: str, account_id: int):
@@ -40,13 +95,26 @@ class ConnectionManager:
         
         # Lưu connection và mapping
         self.active_connections[mssv] = websocket
+        self.outbound[mssv] = OutboundQueue(
+            websocket,
+            max_size=settings.WS_SEND_QUEUE_SIZE,
+            policy=settings.WS_SLOW_CONSUMER_POLICY,
+            send_timeout=settings.WS_SEND_TIMEOUT,
+            on_dead=lambda: self._disconnect_dead(mssv, websocket),
+        )
+        self.outbound[mssv].start()
         self.mssv_to_account[mssv] = account_id
-        print(self.mssv_to_account)
+        self.account_to_mssv[account_id] = mssv
         
         print(f"✅ Unified connection established: {mssv} (Account: {account_id})")
 
     async def disconnect(self, mssv: str):
         """Ngắt kết nối an toàn với comprehensive cleanup"""
+        # Dừng writer task, bỏ các message chưa gửi
+        outbound = self.outbound.pop(mssv, None)
+        if outbound is not None:
+            outbound.close()
+
         # FIX: Kiểm tra sự tồn tại trước khi xóa để tránh KeyError
         if mssv in self.active_connections:
             websocket = self.active_connections[mssv]
@@ -64,6 +132,11 @@ class ConnectionManager:
                 # Sử dụng pop() thay vì del để tránh KeyError
                 self.active_connections.pop(mssv, None)
         
+        # Huỷ verify frame đang xử lý của connection này
+        verify_task = self.verify_tasks.pop(mssv, None)
+        if verify_task is not None:
+            verify_task.cancel()
+
         # Cancel background tasks (face logic) - sử dụng pop() để an toàn
         if mssv in self.connection_tasks:
             try:
@@ -74,11 +147,44 @@ class ConnectionManager:
                 self.connection_tasks.pop(mssv, None)
             
         # Cleanup account mapping (face logic) - sử dụng pop() để an toàn
-        self.mssv_to_account.pop(mssv, None)
+        account_id = self.mssv_to_account.pop(mssv, None)
+        if account_id is not None and self.account_to_mssv.get(account_id) == mssv:
+            self.account_to_mssv.pop(account_id, None)
         
         # Cleanup user khỏi tất cả rooms (room logic)
         await self._cleanup_user_from_rooms(mssv)
 
+    async def _disconnect_dead(self, mssv: str, websocket: WebSocket):
+        """Writer báo client chết / quá chậm - chỉ ngắt nếu vẫn là connection đó (chưa reconnect)"""
+        if self.active_connections.get(mssv) is websocket:
+            await self.disconnect(mssv)
+
+    # === OUTBOUND ===
+
+    def send_json(self, mssv: str, message: dict, key=None) -> bool:
+        """Enqueue message cho một client (False nếu offline hoặc bị bỏ do queue đầy)"""
+        if mssv not in self.outbound:
+            return False
+        return self.send_raw(mssv, encode_message(message), key)
+
+    def send_raw(self, mssv: str, payload, key=None) -> bool:
+        """Enqueue payload đã encode sẵn (str -> text frame, bytes -> binary frame)"""
+        outbound = self.outbound.get(mssv)
+        if outbound is None:
+            return False
+        return outbound.enqueue(payload, key)
+
+    def broadcast_json(self, mssvs, message: dict, key=None) -> List[str]:
+        """Serialize MỘT lần rồi enqueue cho tất cả client (không await từng client), trả về các client bị bỏ message"""
+        return self.broadcast_raw(mssvs, encode_message(message), key)
+
+    def broadcast_raw(self, mssvs, payload, key=None) -> List[str]:
+        """Enqueue cùng một frame đã encode cho nhiều client"""
+        return [
+            mssv for mssv in mssvs
+            if mssv in self.outbound and not self.outbound[mssv].enqueue(payload, key)
+        ]
+
     # === ROOM MANAGEMENT FEATURES  ===
     
     async def join_room(self, mssv: str, room_id: int):
@@ -87,6 +193,7 @@ class ConnectionManager:
             self.room_participants[room_id] = set()
             
         self.room_participants[room_id].add(mssv)
+        self.mssv_rooms.setdefault(mssv, set()).add(room_id)
         print(f"🏠 {mssv} joined room {room_id}")
 
         # Auto-sync quiz state cho student mới join
@@ -99,70 +206,102 @@ class ConnectionManager:
         """Rời room và cập nhật số lượng"""
         if room_id in self.room_participants:
             self.room_participants[room_id].discard(mssv)
+            self._discard_mssv_room(mssv, room_id)
             print(f"🚪 {mssv} left room {room_id}")
             await self.broadcast_room_count(room_id)
 
     async def broadcast_room_count(self, room_id: int):
-        """Gửi thông tin số lượng người tham gia với error handling"""
-        count = len(self.room_participants.get(room_id, set()))
+        """
+        Yêu cầu gửi số lượng người tham gia (coalesced):
+        - Room chưa gửi trong cửa sổ gần nhất -> gửi ngay
+        - Ngược lại gom vào MỘT lần gửi ở cuối cửa sổ, mang count mới nhất (join storm lúc bắt đầu thi)
+        """
+        if self.room_count_window <= 0:
+            self._send_room_count(room_id)
+            return
+
+        if room_id in self._room_count_pending:
+            self.room_count_stats["coalesced"] += 1
+            return
+
+        loop = asyncio.get_running_loop()
+        wait = self._room_count_sent_at.get(room_id, float("-inf")) + self.room_count_window - loop.time()
+        if wait <= 0:
+            self._send_room_count(room_id)
+            return
+
+        self.room_count_stats["coalesced"] += 1
+        self._room_count_pending[room_id] = asyncio.create_task(self._flush_room_count(room_id, wait))
+
+    async def _flush_room_count(self, room_id: int, delay: float):
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self._room_count_pending.pop(room_id, None)
+        self._send_room_count(room_id)
+
+    def _send_room_count(self, room_id: int):
+        """Gửi count hiện tại cho tất cả người trong room"""
+        participants = self.room_participants.get(room_id, set())
+        count = len(participants)
         message = {
             "type": "room_count_update",
             "room_id": room_id,
             "participant_count": count
         }
         
-        failed_connections = []
-        
-        # Gửi message cho tất cả người trong room
-        for mssv in self.room_participants.get(room_id, set()):
-            if mssv in self.active_connections:
-                try:
-                    await self.active_connections[mssv].send_text(json.dumps(message))
-                except Exception as e:
-                    print(f"❌ Failed to send room update to {mssv}: {e}")
-                    failed_connections.append(mssv)
-        
-        # Cleanup failed connections
-        for mssv in failed_connections:
-            await self.disconnect(mssv)
+        # Gửi message cho tất cả người trong room (count cũ chưa gửi được thay bằng count mới)
+        self.broadcast_json(participants, message, key=("room_count", room_id))
+        self.room_count_stats["sent"] += 1
+
+        if participants:
+            self._room_count_sent_at[room_id] = asyncio.get_running_loop().time()
+        else:
+            self._room_count_sent_at.pop(room_id, None)
 
     async def _cleanup_user_from_rooms(self, mssv: str):
         """Remove user khỏi tất cả rooms và broadcast update"""
-        rooms_to_update = []
+        rooms_to_update = list(self.mssv_rooms.pop(mssv, ()))
         
-        for room_id, participants in self.room_participants.items():
-            if mssv in participants:
-                participants.discard(mssv)
-                rooms_to_update.append(room_id)
+        for room_id in rooms_to_update:
+            self.room_participants.get(room_id, set()).discard(mssv)
         
         # Broadcast count update cho các rooms bị ảnh hưởng
         for room_id in rooms_to_update:
             await self.broadcast_room_count(room_id)
 
+    def _discard_mssv_room(self, mssv: str, room_id: int):
+        rooms = self.mssv_rooms.get(mssv)
+        if rooms is not None:
+            rooms.discard(room_id)
+            if not rooms:
+                self.mssv_rooms.pop(mssv, None)
+
+    def get_mssv_by_account(self, account_id: int) -> Optional[str]:
+        """account_id -> mssv đang kết nối (None nếu offline)"""
+        return self.account_to_mssv.get(account_id)
+
+    def get_student_room(self, mssv: str) -> Optional[int]:
+        """Room hiện tại của học sinh (None nếu chưa join)"""
+        rooms = self.mssv_rooms.get(mssv)
+        return next(iter(rooms)) if rooms else None
+
     # === FACE REGISTRATION FEATURES  ===
     
     async def send_face_registration_request(self, account_id: int, account_data: dict):
         """Gửi face registration request qua unified connection"""
         # Tìm mssv từ account_id
-        print(self.mssv_to_account)
-        target_mssv = None
-        for mssv, stored_account_id in self.mssv_to_account.items():
-            if stored_account_id == account_id:
-                target_mssv = mssv
-                break
+        target_mssv = self.get_mssv_by_account(account_id)
         print(f"🔍 Searching for mssv with account_id {account_id}: Found {target_mssv}")
         if target_mssv and target_mssv in self.active_connections:
-            try:
-                message = {
-                    "type": "face_registration_request",
-                    "account_data": account_data
-                }
-                await self.active_connections[target_mssv].send_text(json.dumps(message))
+            message = {
+                "type": "face_registration_request",
+                "account_data": account_data
+            }
+            if self.send_json(target_mssv, message):
                 print(f"📤 Face registration request sent to {target_mssv}")
                 return True
-            except Exception as e:
-                print(f"❌ Failed to send face request to {target_mssv}: {e}")
-                await self.disconnect(target_mssv)
+            print(f"❌ Failed to queue face request to {target_mssv}")
         
         print(f"❌ Face registration failed: Account {account_id} not connected")
         return False
@@ -172,22 +311,18 @@ class ConnectionManager:
         """Lưu Verify False vào session""" 
 
         if account_id not in self.session_verify:
-            self.session_verify[account_id] = []
+            self.session_verify[account_id] = deque(maxlen=max(3, settings.SESSION_VERIFY_HISTORY))
 
-        image_base64 = session_data.pop("image_base64", None)
+        image_data = session_data.pop("image_data", None)
 
         self.session_verify[account_id].append(session_data)
+        self.session_verify_counts[account_id] = self.session_verify_counts.get(account_id, 0) + 1
         
         interval_result = self.get_session_verify_every_nth(account_id, 3)
 
         if interval_result["success"]:
             selected_session = interval_result["session"]
-            target_mssv = None
-            
-            for mssv, stored_account_id in self.mssv_to_account.items():
-                if stored_account_id == account_id:
-                    target_mssv = mssv
-                    break
+            target_mssv = self.get_mssv_by_account(account_id)
 
             if target_mssv and target_mssv in self.active_connections:
                 try:
@@ -198,36 +333,99 @@ class ConnectionManager:
                     message["session"]["mssv"] = target_mssv
                     message["session"]["has_image"] = bool(selected_session.get("session_id"))
 
-                    if image_base64:
+                    if image_data:
                         session_id = message["session"]["session_id"]
-                        self.session_images[session_id] = image_base64
+                        self.session_images.put(session_id, account_id, image_data)
                     
-                    student_room_id = None
-                    for room_id, participants in self.room_participants.items():
-                        if target_mssv in participants:
-                            student_room_id = room_id
-                            break
-
-                    teacher_mssv = None
-                    if student_room_id in self.quiz_sessions:
-                        teacher_mssv = self.quiz_sessions[student_room_id]["teacher"]
-                    if global_verification_tracker.should_allow_call(account_id, session_data["fraud_score"]):
-                        await self.active_connections[teacher_mssv].send_text(json.dumps(message))
+                    student_room_id = self.get_student_room(target_mssv)
+                    teacher_mssv = self.room_teachers.get(student_room_id)
+                    if teacher_mssv in self.active_connections and global_verification_tracker.should_allow_call(account_id, session_data["fraud_score"]):
+                        self.send_json(teacher_mssv, message)
                     return True
                 except Exception as e:
                     await self.disconnect(target_mssv)
         return False
 
 
+    async def verify_frame(self, account_id: int, image_data: bytes) -> dict:
+        """
+        Decode + continuous verification cho một frame (HTTP /verify và binary frame WebSocket)
+        Verify thất bại -> lưu vào session verify để giáo viên xem lại
+        """
+        opencv_image = decode_image_bytes(image_data)
+
+        result = await continuous_auth_manager.process_verification(account_id, opencv_image)
+
+        if result["success"] is False and "fraud_score" in result:# and result["fraud_score"] <= 0.8:
+            # Giữ ảnh dạng JPEG bytes (ảnh không phải JPEG được nén lại)
+            if is_jpeg(image_data):
+                image_jpeg = bytes(image_data)
+            else:
+                image_jpeg = encode_jpeg(opencv_image, settings.SESSION_IMAGE_JPEG_QUALITY)
+
+            session_verify_item={
+                #"similarity_score": result["similarity_score"],
+                "fraud_score": result["fraud_score"],
+                "session_id": str(uuid.uuid4()),
+                "image_data": image_jpeg,
+            }
+
+            await self.tracking_session_verify(account_id,session_verify_item)
+
+        return result
+
+    async def handle_verify_frame(self, mssv: str, header: dict, payload: memoryview):
+        """Binary frame verify: account lấy từ connection, kết quả trả về trên cùng socket"""
+        account_id = self.mssv_to_account.get(mssv)
+        response = {
+            "type": "verify_result",
+            "request_id": header.get("request_id"),
+        }
+
+        if account_id is None:
+            response.update({"success": False, "message": "Account not connected"})
+        elif len(payload) == 0 or len(payload) > settings.MAX_FILE_SIZE:
+            response.update({"success": False, "message": "Invalid image size"})
+        else:
+            try:
+                response["result"] = await self.verify_frame(account_id, payload)
+                response["success"] = True
+            except ValueError as e:
+                response.update({"success": False, "message": f"Invalid verification image format: {e}"})
+            except Exception as e:
+                response.update({"success": False, "message": f"Error processing verification: {e}"})
+
+        self.send_json(mssv, response)
+
+    async def send_verify_now(self, account_id: int, interval: float) -> bool:
+        """
+        Server push: tới hạn verify (thay cho client polling /continuous-auth/status)
+        Trả về False nếu không gửi được (học sinh offline / kết nối ở worker khác / queue đầy)
+        """
+        target_mssv = self.get_mssv_by_account(account_id)
+
+        if not target_mssv or target_mssv not in self.active_connections:
+            return False
+
+        message = {
+            "type": "verify_now",
+            "account_id": account_id,
+            "verification_interval": interval,
+            "timestamp": datetime.now().timestamp()
+        }
+        # verify_now chưa gửi được thì chỉ cần một cái
+        return self.send_json(target_mssv, message, key="verify_now")
+
     def get_session_verify_every_nth(self, account_id: int, interval: int = 3) -> dict:
         """
         Lấy session mỗi interval lần
         """
 
         sessions = self.session_verify[account_id]
-        total_sessions = len(sessions)
+        total_sessions = self.session_verify_counts.get(account_id, len(sessions))
         if total_sessions % interval == 0 and total_sessions >= interval:
-            target_index = total_sessions - interval
+            # Chỉ giữ lịch sử gần nhất -> index theo vị trí từ cuối
+            target_index = len(sessions) - interval
             return {
                 "success": True,
                 "session": sessions[target_index],
@@ -242,28 +440,23 @@ class ConnectionManager:
         if mssv not in self.active_connections:
             return
         
-        if session_id not in self.session_images:
+        image_data = self.session_images.get(session_id)
+        if image_data is None:
             return
         
-        try:
-            image_base64 = self.session_images[session_id]
+        session_id_bytes = session_id.encode('utf-8')
+        session_id_length = len(session_id_bytes)
+        image_bytes = base64.b64encode(image_data)  # Client đọc payload dạng base64 text
 
-            session_id_bytes = session_id.encode('utf-8')
-            session_id_length = len(session_id_bytes)
-            image_bytes = image_base64.encode('utf-8')  # Convert string to bytes
+        # Tạo header cho binary message
+        message = (
+            session_id_length.to_bytes(4, 'big') + 
+            session_id_bytes +                     
+            image_bytes                             
+        )
 
-            # Tạo header cho binary message
-            message = (
-                session_id_length.to_bytes(4, 'big') + 
-                session_id_bytes +                     
-                image_bytes                             
-            )
-
-    
-            # Gửi binary data
-            await self.active_connections[mssv].send_bytes(message)
-        except:
-            await self.disconnect(mssv)
+        # Gửi binary data
+        self.send_raw(mssv, message)
        
 
     # === QUIZ CONTROL FEATURES ===
@@ -307,6 +500,7 @@ class ConnectionManager:
             "teacher": teacher_mssv,
             "original_duration": duration 
         }
+        self.room_teachers[quiz_id] = teacher_mssv
         
         # Broadcast START signal
         await self.broadcast_quiz_signal(quiz_id, {
@@ -384,6 +578,7 @@ class ConnectionManager:
             
             # Cleanup session
             self.quiz_sessions.pop(quiz_id, None)
+            self.room_teachers.pop(quiz_id, None)
             
             print(f"🏁 Quiz {quiz_id} ended and cleaned up")
 
@@ -392,21 +587,14 @@ class ConnectionManager:
     async def broadcast_quiz_signal(self, quiz_id: int, message: dict):
         """Broadcast quiz control signal to all participants in the room"""
         participants = self.room_participants.get(quiz_id, set())
-        failed_connections = []
         
         print(f"📡 Broadcasting quiz signal to {len(participants)} participants in room {quiz_id}")
         
-        for mssv in participants:
-            if mssv in self.active_connections:
-                try:
-                    await self.active_connections[mssv].send_text(json.dumps(message))
-                    print(f"  ✓ Sent to {mssv}")
-                except Exception as e:
-                    print(f"  ✗ Failed to send quiz signal to {mssv}: {e}")
-                    failed_connections.append(mssv)
+        failed_connections = self.broadcast_json(participants, message)
         
-        # Cleanup failed connections
+        # Client không nhận được quiz signal (queue đầy) -> ngắt để reconnect và sync lại quiz state
         for mssv in failed_connections:
+            print(f"  ✗ Failed to queue quiz signal to {mssv}")
             await self.disconnect(mssv)
 
     async def broadcast_to_all(self, message: dict):
@@ -414,20 +602,8 @@ class ConnectionManager:
         if not self.active_connections:
             return
         
-        message_str = json.dumps(message)
-        disconnected_users = []
-        
         # Gửi đến tất cả connections
-        for mssv, websocket in self.active_connections.items():
-            try:
-                await websocket.send_text(message_str)
-            except Exception as e:
-                print(f"❌ Failed to send to {mssv}: {e}")
-                disconnected_users.append(mssv)
-        
-        # Cleanup failed connections
-        for mssv in disconnected_users:
-            await self.disconnect(mssv)
+        self.broadcast_json(list(self.active_connections), message)
 
     async def send_quiz_state_to_student(self, mssv: str, quiz_id: int):
         """Gửi current quiz state cho student mới join"""
@@ -456,12 +632,8 @@ class ConnectionManager:
             "timestamp": datetime.now().timestamp()
         }
         
-        if mssv in self.active_connections:
-            try:
-                await self.active_connections[mssv].send_text(json.dumps(message))
-                print(f"📤 Quiz state sent to new participant {mssv}")
-            except Exception as e:
-                print(f"❌ Failed to send quiz state to {mssv}: {e}")
+        if self.send_json(mssv, message):
+            print(f"📤 Quiz state sent to new participant {mssv}")
 
     # === Auto-End Quiz  ====
     async def handle_student_submit(self, mssv: str, quiz_id: int, score: int):
@@ -523,28 +695,19 @@ class ConnectionManager:
         
         # Cleanup session và submissions
         self.quiz_sessions.pop(quiz_id, None)
+        self.room_teachers.pop(quiz_id, None)
         self.quiz_submissions.pop(quiz_id, None)
         
         print(f"🏁 Quiz {quiz_id} auto-ended: {reason}")
 
     # === CLEAN SESSION VERIFY ====
     async def end_session_verify_request(self,account_id:int):
-        if account_id not in self.session_verify:
-            return
-        
-        sessions_to_clean = self.session_verify[account_id]
-        session_ids_to_remove = {
-            session["session_id"] 
-            for session in sessions_to_clean 
-            if "session_id" in session
-        }
-
-        # Cleanup images từ session_images dictionary
-        for session_id in session_ids_to_remove:
-            self.session_images.pop(session_id, None)
+        # Cleanup images của account trong session image store
+        self.session_images.drop_account(account_id)
         
         #cleanup session
         self.session_verify.pop(account_id,None)
+        self.session_verify_counts.pop(account_id,None)
 
 
 
@@ -562,12 +725,7 @@ class ConnectionManager:
         }
         
         participants = self.room_participants.get(quiz_id, set())
-        for mssv in participants:
-            if mssv in self.active_connections:
-                try:
-                    await self.active_connections[mssv].send_text(json.dumps(message))
-                except Exception as e:
-                    print(f"❌ Failed to send submission to {mssv}: {e}")
+        self.broadcast_json(participants, message)
 
     # === QUIZ STATUS CHECK FEATURES === 
 
@@ -663,23 +821,59 @@ class ConnectionManager:
         except Exception as e:
             print(f"❌ Message handling error for {mssv}: {e}")
 
+    async def handle_binary_message(self, mssv: str, data: bytes):
+        """
+        Routing binary frame theo type trong header
+        verify_frame được xử lý trong task riêng: receive loop trả về ngay và vẫn phục vụ ping / room / quiz
+        trong lúc inference chạy; frame đến khi frame trước chưa xong -> trả về busy, bỏ frame
+        """
+        try:
+            header, payload = parse_binary_frame(data)
+        except ValueError as e:
+            print(f"⚠️ Invalid binary frame from {mssv}: {e}")
+            return
+
+        message_type = header.get("type")
+        if message_type == "verify_frame":
+            self._dispatch_verify_frame(mssv, header, payload)
+        else:
+            print(f"⚠️ Unhandled binary message type from {mssv}: {message_type}")
+
+    def _dispatch_verify_frame(self, mssv: str, header: dict, payload: memoryview):
+        running = self.verify_tasks.get(mssv)
+        if running is not None and not running.done():
+            self.send_json(mssv, {
+                "type": "verify_result",
+                "request_id": header.get("request_id"),
+                "success": False,
+                "busy": True,
+                "message": "Previous verification is still processing"
+            })
+            return
+
+        task = asyncio.create_task(self._run_verify_frame(mssv, header, payload))
+        self.verify_tasks[mssv] = task
+        task.add_done_callback(lambda done: self._verify_task_done(mssv, done))
+
+    async def _run_verify_frame(self, mssv: str, header: dict, payload: memoryview):
+        try:
+            await self.handle_verify_frame(mssv, header, payload)
+        except Exception as e:
+            print(f"❌ Binary message handling error for {mssv}: {e}")
+
+    def _verify_task_done(self, mssv: str, task: asyncio.Task):
+        # Chỉ xoá nếu vẫn là task của mssv (connection mới có thể đã tạo task khác)
+        if self.verify_tasks.get(mssv) is task:
+            self.verify_tasks.pop(mssv, None)
+
     async def send_pong(self, mssv: str):
         """Gửi pong response"""
-        if mssv in self.active_connections:
-            try:
-                await self.active_connections[mssv].send_text(json.dumps({"type": "pong"}))
-            except Exception as e:
-                print(f"❌ Failed to send pong to {mssv}: {e}")
-                await self.disconnect(mssv)
+        self.send_raw(mssv, PONG_FRAME, key="pong")
 
     async def send_heartbeat(self, mssv: str):
         """Gửi heartbeat để maintain connection"""
-        if mssv in self.active_connections:
-            try:
-                await self.active_connections[mssv].send_text(json.dumps({"type": "heartbeat"}))
-            except Exception as e:
-                print(f"❌ Failed to send heartbeat to {mssv}: {e}")
-                await self.disconnect(mssv)
+        self.send_raw(mssv, HEARTBEAT_FRAME, key="heartbeat")
 
 # Global manager instance
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager()
+verification_scheduler.subscribe(manager.send_verify_now)
\ No newline at end of file
@@ -0,0 +1,212 @@
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.core.embedding_codec import encode_embedding
+
+logger = logging.getLogger("uvicorn.error")
+
+ChangeListener = Callable[[Dict[str, Any]], None]
+
+
+class EmbeddingChangeFeed:
+    """
+    Kênh thông báo thay đổi nhandien / nguoidung giữa các gunicorn worker:
+    - Write path publish event (add / remove / remove_person / update)
+    - Event được append vào một journal file dùng chung (JSON lines, O_APPEND)
+    - Kích thước journal chính là generation counter: poll() chỉ os.stat() rồi đọc phần mới
+    - Listener trong cùng process nhận event ngay lúc publish, process khác nhận ở lần poll kế tiếp
+    - Journal bị xoay vòng / mất -> listener nhận event "reset" và tự load lại toàn bộ
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._listeners: List[ChangeListener] = []
+        self._lock = threading.Lock()
+
+        # Vị trí đã đọc trong journal - khởi tạo lazy (sau fork)
+        self._offset: Optional[int] = None
+        self._inode: Optional[int] = None
+
+        self.stats = {
+            "published": 0,
+            "received": 0,
+            "resets": 0,
+        }
+
+    def subscribe(self, listener: ChangeListener) -> None:
+        self._listeners.append(listener)
+
+    def mark(self) -> None:
+        """
+        Đánh dấu journal hiện tại là đã đọc hết.
+        Gọi TRƯỚC khi cache load toàn bộ từ database, event đến sau đó sẽ được replay
+        (listener phải idempotent).
+        """
+        with self._lock:
+            self._offset, self._inode = self._journal_position()
+
+    def position(self) -> Tuple[int, Optional[int]]:
+        """(offset, inode) đã đọc tới - lưu kèm snapshot để worker khác replay phần sau"""
+        with self._lock:
+            if self._offset is None:
+                self._offset, self._inode = self._journal_position()
+            return self._offset, self._inode
+
+    def replay_from(self, offset: int, inode: Optional[int]) -> bool:
+        """
+        Áp dụng lại mọi event (kể cả của process này) từ vị trí offset
+        False nếu journal đã xoay vòng - caller phải load lại toàn bộ
+        """
+        if not self.path:
+            return True
+
+        with self._lock:
+            size, current_inode = self._journal_position()
+            # (0, None): snapshot được tạo khi chưa có journal -> đọc từ đầu journal hiện tại
+            if (offset, inode) != (0, None) and (inode != current_inode or size < offset):
+                return False
+            self._offset, self._inode = offset, current_inode
+            events = self._read_from(offset, size) if size > offset else []
+
+        for event in events:
+            self._dispatch(event)
+        return True
+
+    def publish(self, op: str, **payload: Any) -> None:
+        """Phát một thay đổi (gọi SAU khi commit thành công)"""
+        event = {"op": op, "pid": os.getpid(), "ts": time.time(), **payload}
+        self.stats["published"] += 1
+
+        if self.path:
+            try:
+                self._append(event)
+            except Exception as e:
+                logger.error(f"Cannot write embedding change journal: {e}")
+
+        self._dispatch(event)
+
+    def poll(self) -> int:
+        """Đọc event mới từ process khác, trả về số event đã áp dụng"""
+        if not self.path:
+            return 0
+
+        with self._lock:
+            if self._offset is None:
+                self._offset, self._inode = self._journal_position()
+                return 0
+
+            size, inode = self._journal_position()
+            if size == self._offset and inode == self._inode:
+                return 0
+
+            if self._inode is None and self._offset == 0:
+                # Journal mới được tạo kể từ lần đọc trước -> đọc từ đầu
+                self._inode = inode
+                events = self._read_from(0, size)
+            elif inode != self._inode or size < self._offset:
+                # Journal đã bị xoay vòng, có thể đã mất event -> load lại
+                self._offset, self._inode = size, inode
+                self.stats["resets"] += 1
+                events = [{"op": "reset"}]
+            else:
+                events = self._read_from(self._offset, size)
+
+        applied = 0
+        for event in events:
+            if event.get("pid") == os.getpid():
+                continue
+            self.stats["received"] += 1
+            self._dispatch(event)
+            applied += 1
+        return applied
+
+    def _dispatch(self, event: Dict[str, Any]) -> None:
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"Embedding change listener failed ({event.get('op')}): {e}")
+
+    def _journal_position(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_size, stat.st_ino
+        except FileNotFoundError:
+            return 0, None
+
+    def _read_from(self, offset: int, size: int) -> List[Dict[str, Any]]:
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            data = f.read(size - offset)
+
+        # Chỉ lấy các dòng đã ghi trọn vẹn, phần dở dang đọc lại ở lần poll sau
+        end = data.rfind(b"\n") + 1
+        self._offset = offset + end
+
+        events = []
+        for line in data[:end].splitlines():
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                logger.error("Skipping malformed embedding change event")
+        return events
+
+    def _append(self, event: Dict[str, Any]) -> None:
+        line = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+
+        if self.max_bytes and size > self.max_bytes:
+            # Xoay vòng: các worker thấy inode mới sẽ load lại index một lần
+            try:
+                os.replace(self.path, f"{self.path}.1")
+            except OSError:
+                pass
+
+
+def publish_embedding_added(row_id: int, ma_so: str, ho_ten: str, embedding: np.ndarray, danh_gia: Optional[float]) -> None:
+    """Embedding mới: gửi kèm vector để worker khác không phải query lại database"""
+    embedding_changes.publish(
+        "add",
+        id=int(row_id),
+        ma_so=ma_so,
+        ho_ten=ho_ten,
+        danh_gia=float(danh_gia or 0.0),
+        embedding=base64.b64encode(encode_embedding(embedding)).decode("ascii"),
+    )
+
+
+def publish_embeddings_removed(ids: List[int]) -> None:
+    embedding_changes.publish("remove", ids=[int(row_id) for row_id in ids])
+
+
+def publish_persons_removed(ma_so: List[str]) -> None:
+    embedding_changes.publish("remove_person", ma_so=list(ma_so))
+
+
+def publish_person_updated(ma_so: str, **fields: Any) -> None:
+    embedding_changes.publish("update", ma_so=ma_so, fields=fields)
+
+
+# Global feed - một journal dùng chung cho mọi worker
+embedding_changes = EmbeddingChangeFeed(
+    path=settings.EMBEDDING_CHANGELOG_PATH,
+    max_bytes=settings.EMBEDDING_CHANGELOG_MAX_BYTES,
+)
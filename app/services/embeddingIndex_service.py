@@ -0,0 +1,589 @@
+import base64
+import logging
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.embedding_codec import decode_embedding
+from app.services.embeddingChanges_service import embedding_changes
+from app.services.embedding_service import get_all_embeddings, get_embedding_fingerprint, get_embeddings_after
+from app.services.sharedEmbeddingStore_service import SharedEmbeddingStore
+
+logger = logging.getLogger("uvicorn.error")
+
+class IVFIndex:
+    """
+    Inverted-file index (ANN) chạy thuần NumPy trên CPU:
+    - Coarse quantizer: spherical k-means, nlist centroid
+    - Mỗi centroid giữ danh sách các hàng thuộc về nó (CSR: list_offsets + list_rows)
+    - Search chỉ quét nprobe danh sách gần query nhất -> đánh đổi recall / latency
+    - Thêm hàng mới không cần train lại (gán vào centroid gần nhất)
+    """
+
+    def __init__(self, centroids: np.ndarray, list_offsets: np.ndarray, list_rows: np.ndarray,
+                 extras: Optional[Dict[int, Tuple[int, ...]]] = None, trained_size: int = 0):
+        self.centroids = centroids          # (nlist, D) float32, đã normalize
+        self.list_offsets = list_offsets    # (nlist + 1,) int64
+        self.list_rows = list_rows          # (N,) int64 - hàng của matrix, gom theo list
+        self.extras = extras or {}          # list_id -> hàng thêm sau khi build
+        self.trained_size = trained_size
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> "IVFIndex":
+        nlist = max(1, min(nlist, matrix.shape[0]))
+        centroids = _train_centroids(matrix, nlist, iterations, seed)
+        return cls.from_assignments(centroids, _assign(matrix, centroids), matrix.shape[0])
+
+    @classmethod
+    def from_assignments(cls, centroids: np.ndarray, assignments: np.ndarray, trained_size: int) -> "IVFIndex":
+        order = np.argsort(assignments, kind="stable").astype(np.int64)
+        counts = np.bincount(assignments, minlength=centroids.shape[0])
+        offsets = np.zeros(centroids.shape[0] + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(centroids, offsets, order, trained_size=trained_size)
+
+    def assignments(self, size: int) -> np.ndarray:
+        """List id của từng hàng (gộp cả extras) - dùng khi persist"""
+        assignments = np.empty(size, dtype=np.int64)
+        for list_id in range(self.nlist):
+            assignments[self.list_rows[self.list_offsets[list_id]:self.list_offsets[list_id + 1]]] = list_id
+        for list_id, rows in self.extras.items():
+            assignments[list(rows)] = list_id
+        return assignments
+
+    def with_rows(self, rows: np.ndarray, vectors: np.ndarray) -> "IVFIndex":
+        """Trả về IVFIndex mới có thêm các hàng (copy-on-write, không sửa bản đang được search)"""
+        extras = dict(self.extras)
+        for row, list_id in zip(rows, _assign(vectors, self.centroids)):
+            extras[int(list_id)] = extras.get(int(list_id), ()) + (int(row),)
+        return IVFIndex(self.centroids, self.list_offsets, self.list_rows, extras, self.trained_size)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Các hàng nằm trong nprobe list gần query nhất"""
+        nprobe = max(1, min(nprobe, self.nlist))
+        probe = _top_k(self.centroids @ query, nprobe)
+
+        parts = [self.list_rows[self.list_offsets[list_id]:self.list_offsets[list_id + 1]] for list_id in probe]
+        parts.extend(np.asarray(self.extras[list_id], dtype=np.int64) for list_id in probe if list_id in self.extras)
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(parts)
+
+
+class _IndexSnapshot:
+    """Dữ liệu bất biến của index - thay thế nguyên khối khi có thay đổi"""
+
+    __slots__ = ("matrix", "ids", "ma_so", "ho_ten", "danh_gia", "rows_by_ma_so", "ivf")
+
+    def __init__(self, matrix, ids, ma_so, ho_ten, danh_gia, ivf: Optional[IVFIndex] = None):
+        self.matrix = matrix        # (N, D) float32, mỗi hàng đã L2-normalize
+        self.ids = ids              # nhandien.id
+        self.ma_so = ma_so
+        self.ho_ten = ho_ten
+        self.danh_gia = danh_gia
+        self.ivf = ivf
+
+        # ma_so -> các hàng của người đó (dùng cho verification theo SVM label)
+        self.rows_by_ma_so: Dict[str, np.ndarray] = {}
+        if len(ma_so):
+            order = np.argsort(ma_so, kind="stable")
+            keys, starts = np.unique(ma_so[order], return_index=True)
+            for key, rows in zip(keys, np.split(order, starts[1:])):
+                self.rows_by_ma_so[str(key)] = rows
+
+    @classmethod
+    def empty(cls) -> "_IndexSnapshot":
+        return cls(
+            np.empty((0, 0), dtype=np.float32),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=object),
+            np.empty(0, dtype=object),
+            np.empty(0, dtype=np.float64),
+        )
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+
+class EmbeddingIndex:
+    """
+    Index embedding thường trú trong process:
+    - Ma trận float32 liên tục chứa embedding đã L2-normalize
+    - Các mảng song song ma_so / ho_ten / danh_gia
+    - Top-k = một phép nhân ma trận-vector thay vì loop json.loads từng dòng
+    - Backend "ivf": ANN (IVFIndex) cho tập enroll lớn
+    - Cập nhật incremental theo embedding_changes (add / remove) thay vì load lại toàn bộ
+    - Snapshot publish vào SharedEmbeddingStore (mmap), mọi worker map chung một bản
+    """
+
+    def __init__(self, backend: str = "exact"):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._snapshot = _IndexSnapshot.empty()
+        self._loaded = False
+
+        # Generation của shared snapshot đang map, _dirty = đã thay đổi riêng sau khi map
+        self._generation = 0
+        self._dirty = False
+        self._published_at = 0.0
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    def ensure_loaded(self, db: Session) -> None:
+        """
+        Load index ở lần gọi đầu tiên (map shared snapshot nếu còn khớp, không thì từ database)
+        Các lần sau: chuyển sang generation mới nếu có, áp dụng thay đổi từ worker khác
+        """
+        if self._loaded:
+            self._replay(db, self._sync_shared())
+            embedding_changes.poll()
+            self._maybe_publish()
+            if self._loaded:
+                return
+
+        replay_position = None
+        with self._lock:
+            if self._loaded:
+                return
+            replay_position = self._load_shared(db)
+            if replay_position is None:
+                embedding_changes.mark()
+                self._load(db)
+            self._loaded = True
+
+        self._replay(db, replay_position)
+        self._maybe_publish(force=self._dirty and self._generation == 0)
+
+    def reload(self, db: Session) -> None:
+        """Load lại toàn bộ index từ database"""
+        with self._lock:
+            embedding_changes.mark()
+            self._load(db)
+            self._loaded = True
+        self._maybe_publish(force=True)
+
+    def _replay(self, db: Session, position: Optional[Tuple[int, Optional[int]]]) -> None:
+        """Áp dụng các thay đổi ghi sau snapshot; journal đã xoay vòng thì load lại toàn bộ"""
+        if position is not None and not embedding_changes.replay_from(*position):
+            logger.info("Embedding change journal rotated since snapshot, reloading from database")
+            self.reload(db)
+
+    def _load(self, db: Session) -> None:
+        ids, ma_so, ho_ten, danh_gia, matrix = _decode_rows(get_all_embeddings(db))
+        self._snapshot = _IndexSnapshot(matrix, ids, ma_so, ho_ten, danh_gia, self._build_ivf(matrix))
+        self._generation = 0
+        self._dirty = True
+        logger.info(f"Embedding index loaded: {len(self._snapshot)} embeddings (backend={self.backend})")
+
+    def _build_ivf(self, matrix: np.ndarray) -> Optional[IVFIndex]:
+        if self.backend != "ivf" or matrix.shape[0] < max(1, settings.EMBEDDING_IVF_MIN_SIZE):
+            return None
+        nlist = settings.EMBEDDING_IVF_NLIST or int(math.sqrt(matrix.shape[0]))
+        ivf = IVFIndex.build(matrix, nlist)
+        logger.info(f"IVF index built: nlist={ivf.nlist}, size={matrix.shape[0]}")
+        return ivf
+
+    def add(self, row_id: int, ma_so: str, ho_ten: str, embedding: np.ndarray, danh_gia: float) -> None:
+        """Thêm một embedding mới (copy-on-write, reader không bị block)"""
+        if not self._loaded:
+            # Chưa load thì lần load đầu tiên sẽ lấy luôn dòng mới từ database
+            return
+
+        vector = _normalize_rows(np.asarray(embedding, dtype=np.float32).reshape(1, -1))
+        with self._lock:
+            if np.any(self._snapshot.ids == row_id):
+                # Event replay sau khi load -> dòng đã có trong index
+                return
+            self._append(
+                np.asarray([row_id], dtype=np.int64),
+                np.asarray([ma_so], dtype=object),
+                np.asarray([ho_ten], dtype=object),
+                np.asarray([float(danh_gia or 0.0)], dtype=np.float64),
+                vector,
+            )
+
+    def _append(self, ids, ma_so, ho_ten, danh_gia, vectors) -> None:
+        current = self._snapshot
+        if len(current) and current.matrix.shape[1] != vectors.shape[1]:
+            logger.error(f"Cannot index embedding: dimension {vectors.shape[1]} != {current.matrix.shape[1]}")
+            return
+
+        matrix = vectors if not len(current) else np.vstack([current.matrix, vectors])
+        ivf = current.ivf
+        if ivf is not None and matrix.shape[0] > 2 * ivf.trained_size:
+            # Tập dữ liệu đã tăng gấp đôi từ lúc train -> train lại centroid
+            ivf = self._build_ivf(matrix)
+        elif ivf is not None:
+            ivf = ivf.with_rows(np.arange(len(current), matrix.shape[0]), vectors)
+        else:
+            ivf = self._build_ivf(matrix)
+
+        self._snapshot = _IndexSnapshot(
+            matrix,
+            np.concatenate([current.ids, ids]),
+            np.concatenate([current.ma_so, ma_so]),
+            np.concatenate([current.ho_ten, ho_ten]),
+            np.concatenate([current.danh_gia, danh_gia]),
+            ivf,
+        )
+        self._dirty = True
+
+    def remove(self, ids: Optional[List[int]] = None, ma_so: Optional[List[str]] = None) -> int:
+        """Xoá embedding theo nhandien.id hoặc theo người (ma_so), trả về số dòng đã xoá"""
+        with self._lock:
+            current = self._snapshot
+            mask = np.zeros(len(current), dtype=bool)
+            if ids:
+                mask |= np.isin(current.ids, np.asarray(ids, dtype=np.int64))
+            if ma_so:
+                mask |= np.isin(current.ma_so.astype(str), np.asarray(ma_so, dtype=str))
+
+            removed = int(mask.sum())
+            if not removed:
+                return 0
+
+            keep = ~mask
+            ivf = current.ivf
+            if ivf is not None:
+                ivf = IVFIndex.from_assignments(ivf.centroids, ivf.assignments(len(current))[keep], ivf.trained_size)
+
+            self._snapshot = _IndexSnapshot(
+                current.matrix[keep],
+                current.ids[keep],
+                current.ma_so[keep],
+                current.ho_ten[keep],
+                current.danh_gia[keep],
+                ivf,
+            )
+            self._dirty = True
+            return removed
+
+    def rename(self, ma_so: str, ho_ten: str) -> None:
+        """Cập nhật họ tên hiển thị cho các embedding của một người"""
+        with self._lock:
+            current = self._snapshot
+            rows = current.rows_by_ma_so.get(str(ma_so))
+            if rows is None:
+                return
+            names = current.ho_ten.astype(object)
+            names[rows] = ho_ten
+            self._snapshot = _IndexSnapshot(current.matrix, current.ids, current.ma_so, names, current.danh_gia, current.ivf)
+            self._dirty = True
+
+    def apply_change(self, event: Dict[str, Any]) -> None:
+        """Listener của embedding_changes"""
+        op = event.get("op")
+        if op == "reset":
+            # Có thể đã mất event -> load lại toàn bộ ở request kế tiếp
+            self._loaded = False
+            return
+        if not self._loaded:
+            return
+
+        if op == "add":
+            self.add(
+                event["id"],
+                event["ma_so"],
+                event["ho_ten"],
+                decode_embedding(base64.b64decode(event["embedding"])),
+                event.get("danh_gia"),
+            )
+        elif op == "remove":
+            self.remove(ids=event.get("ids"))
+        elif op == "remove_person":
+            self.remove(ma_so=event.get("ma_so"))
+        elif op == "update":
+            ho_ten = (event.get("fields") or {}).get("ho_ten")
+            if ho_ten:
+                self.rename(event["ma_so"], ho_ten)
+
+    def count(self, ma_so: Optional[str] = None) -> int:
+        snapshot = self._snapshot
+        if ma_so is None:
+            return len(snapshot)
+        rows = snapshot.rows_by_ma_so.get(str(ma_so))
+        return 0 if rows is None else len(rows)
+
+    def search(self, query: np.ndarray, k: int = 5, ma_so: Optional[str] = None, exact: bool = False) -> List[Dict[str, Any]]:
+        """
+        Tìm top-k embedding gần nhất theo cosine similarity
+        ma_so: chỉ so sánh với các embedding của người này (SVM label)
+        exact: bỏ qua IVF, quét toàn bộ ma trận
+        """
+        snapshot = self._snapshot
+        if not len(snapshot) or k <= 0:
+            return []
+
+        query = np.asarray(query, dtype=np.float32).ravel()
+        if query.shape[0] != snapshot.matrix.shape[1]:
+            logger.error(f"Query dimension {query.shape[0]} != index dimension {snapshot.matrix.shape[1]}")
+            return []
+
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query = query / norm
+
+        if ma_so is not None:
+            rows = snapshot.rows_by_ma_so.get(str(ma_so))
+            if rows is None:
+                return []
+        elif snapshot.ivf is not None and not exact:
+            rows = snapshot.ivf.candidates(query, settings.EMBEDDING_IVF_NPROBE)
+        else:
+            rows = None
+
+        if rows is not None:
+            scores = snapshot.matrix[rows] @ query
+        else:
+            scores = snapshot.matrix @ query
+
+        top = _top_k(scores, k)
+        if rows is not None:
+            positions = rows[top]
+        else:
+            positions = top
+
+        return [
+            {
+                "id": int(snapshot.ids[pos]),
+                "ho_ten": snapshot.ho_ten[pos],
+                "ma_so": snapshot.ma_so[pos],
+                "danh_gia": float(snapshot.danh_gia[pos]),
+                "similarity": float(score),
+            }
+            for pos, score in zip(positions, scores[top])
+        ]
+
+    # === SHARED SNAPSHOT (mmap giữa các worker) ===
+
+    def _sync_shared(self) -> Optional[Tuple[int, Optional[int]]]:
+        """Chuyển sang generation mới hơn nếu worker khác vừa publish, trả về vị trí journal cần replay"""
+        meta = shared_store.current()
+        if meta is None or meta["generation"] <= self._generation or meta.get("backend") != self.backend:
+            return None
+        with self._lock:
+            if meta["generation"] <= self._generation:
+                return None
+            try:
+                self._snapshot = self._snapshot_from_arrays(meta, shared_store.open(meta))
+            except Exception as e:
+                logger.warning(f"Cannot map shared embedding generation {meta['generation']}: {e}")
+                return None
+            self._generation = meta["generation"]
+            self._dirty = False
+        return tuple(meta["journal"])
+
+    def _load_shared(self, db: Session) -> Optional[Tuple[int, Optional[int]]]:
+        """
+        Map generation hiện tại (không decode / build lại). Chỉ dùng khi còn khớp database:
+        - Mọi dòng trong snapshot vẫn còn (số dòng DB có id <= max id không đổi)
+        - Dòng mới (id lớn hơn, ví dụ ghi khi server tắt) được lấy thêm từ database
+        Trả về vị trí journal cần replay, None nếu phải load từ database
+        """
+        meta = shared_store.current()
+        if meta is None or meta.get("backend") != self.backend:
+            return None
+
+        try:
+            snapshot = self._snapshot_from_arrays(meta, shared_store.open(meta))
+        except Exception as e:
+            logger.warning(f"Cannot map shared embedding snapshot: {e}")
+            return None
+
+        new_rows = get_embeddings_after(db, int(meta.get("max_id", 0)))
+        db_count, _ = get_embedding_fingerprint(db)
+        if db_count != len(snapshot) + len(new_rows):
+            # Có dòng bị xoá kể từ lúc publish -> build lại từ database
+            logger.info("Shared embedding snapshot is stale, rebuilding from database")
+            return None
+
+        self._snapshot = snapshot
+        self._generation = meta["generation"]
+        self._dirty = False
+        if new_rows:
+            self._append(*_decode_rows(new_rows))
+
+        logger.info(f"Embedding index mapped from generation {meta['generation']}: {len(self._snapshot)} embeddings "
+                    f"({len(new_rows)} new from database)")
+        return tuple(meta["journal"])
+
+    def _maybe_publish(self, force: bool = False) -> None:
+        """Publish snapshot đã thay đổi (tối đa một lần mỗi EMBEDDING_SHARED_PUBLISH_INTERVAL giây)"""
+        if not shared_store.enabled or not self._dirty:
+            return
+        if not force and time.time() - self._published_at < settings.EMBEDDING_SHARED_PUBLISH_INTERVAL:
+            return
+
+        with self._lock:
+            journal = embedding_changes.position()
+            meta = shared_store.current()
+            if not force and meta is not None and meta["generation"] > self._generation:
+                # Worker khác đã publish bản mới hơn -> lần sync sau sẽ chuyển sang
+                return
+
+            snapshot = self._snapshot
+            arrays = {
+                "matrix": np.ascontiguousarray(snapshot.matrix, dtype=np.float32),
+                "ids": snapshot.ids,
+                "ma_so": snapshot.ma_so.astype(str),
+                "ho_ten": snapshot.ho_ten.astype(str),
+                "danh_gia": snapshot.danh_gia,
+            }
+            if snapshot.ivf is not None:
+                compact = IVFIndex.from_assignments(
+                    snapshot.ivf.centroids, snapshot.ivf.assignments(len(snapshot)), snapshot.ivf.trained_size
+                )
+                arrays["ivf_centroids"] = compact.centroids
+                arrays["ivf_list_offsets"] = compact.list_offsets
+                arrays["ivf_list_rows"] = compact.list_rows
+
+            published = shared_store.publish(
+                arrays,
+                backend=self.backend,
+                size=len(snapshot),
+                max_id=int(snapshot.ids.max()) if len(snapshot) else 0,
+                ivf_trained_size=snapshot.ivf.trained_size if snapshot.ivf is not None else 0,
+                journal=list(journal),
+            )
+            self._published_at = time.time()
+            if published is None:
+                return
+
+            # Map lại bản vừa ghi để bộ nhớ riêng của worker được giải phóng
+            self._snapshot = self._snapshot_from_arrays(published, shared_store.open(published))
+            self._generation = published["generation"]
+            self._dirty = False
+            logger.info(f"Embedding index published as generation {published['generation']} ({len(snapshot)} embeddings)")
+
+    @staticmethod
+    def _snapshot_from_arrays(meta: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> _IndexSnapshot:
+        ivf = None
+        if "ivf_centroids" in arrays:
+            ivf = IVFIndex(
+                arrays["ivf_centroids"],
+                arrays["ivf_list_offsets"],
+                arrays["ivf_list_rows"],
+                trained_size=int(meta.get("ivf_trained_size", 0)),
+            )
+        return _IndexSnapshot(
+            arrays["matrix"],
+            arrays["ids"],
+            arrays["ma_so"],
+            arrays["ho_ten"],
+            arrays["danh_gia"],
+            ivf,
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "backend": self.backend,
+            "loaded": self._loaded,
+            "size": len(snapshot),
+            "generation": self._generation,
+            "shared": isinstance(snapshot.matrix, np.memmap),
+            "dirty": self._dirty,
+        }
+
+
+def _decode_rows(rows) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Decode các dòng (id, ho_ten, embedding_vector, ma_so, danh_gia) thành mảng song song"""
+    ids, ma_so, ho_ten, danh_gia, vectors = [], [], [], [], []
+    dim = None
+
+    for row_id, ten, embedding_vector, maso, quality in rows:
+        try:
+            vector = decode_embedding(embedding_vector)
+        except Exception as e:
+            logger.error(f"Invalid stored embedding id={row_id}: {e}")
+            continue
+
+        if dim is None:
+            dim = vector.shape[0]
+        if vector.ndim != 1 or vector.shape[0] != dim:
+            logger.error(f"Shape mismatch for {ten}: stored={vector.shape}, expected=({dim},)")
+            continue
+
+        ids.append(row_id)
+        ma_so.append(maso)
+        ho_ten.append(ten)
+        danh_gia.append(float(quality) if quality is not None else 0.0)
+        vectors.append(vector)
+
+    if vectors:
+        matrix = _normalize_rows(np.vstack(vectors))
+    else:
+        matrix = np.empty((0, 0), dtype=np.float32)
+
+    return (
+        np.asarray(ids, dtype=np.int64),
+        np.asarray(ma_so, dtype=object),
+        np.asarray(ho_ten, dtype=object),
+        np.asarray(danh_gia, dtype=np.float64),
+        matrix,
+    )
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize từng hàng, trả về ma trận float32 C-contiguous"""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Vị trí top-k score, sắp xếp giảm dần"""
+    k = min(k, scores.shape[0])
+    if k < scores.shape[0]:
+        top = np.argpartition(scores, -k)[-k:]
+    else:
+        top = np.arange(scores.shape[0])
+    return top[np.argsort(scores[top])[::-1]]
+
+
+def _assign(matrix: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+    """Centroid gần nhất (cosine) cho từng hàng, tính theo chunk để giới hạn bộ nhớ"""
+    assignments = np.empty(matrix.shape[0], dtype=np.int64)
+    for start in range(0, matrix.shape[0], chunk_size):
+        assignments[start:start + chunk_size] = np.argmax(matrix[start:start + chunk_size] @ centroids.T, axis=1)
+    return assignments
+
+
+def _train_centroids(matrix: np.ndarray, nlist: int, iterations: int, seed: int) -> np.ndarray:
+    """Spherical k-means trên tập mẫu (tối đa 256 điểm mỗi centroid)"""
+    rng = np.random.default_rng(seed)
+    sample_size = min(matrix.shape[0], nlist * 256)
+    sample = matrix[rng.choice(matrix.shape[0], sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+
+        # Centroid rỗng -> khởi tạo lại bằng một điểm ngẫu nhiên
+        empty = np.bincount(assignments, minlength=nlist) == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+        centroids = _normalize_rows(sums)
+
+    return centroids
+
+
+# Global index instance - dùng chung trong mỗi worker
+shared_store = SharedEmbeddingStore(settings.EMBEDDING_INDEX_DIR)
+embedding_index = EmbeddingIndex(backend=settings.EMBEDDING_INDEX_BACKEND)
+embedding_changes.subscribe(embedding_index.apply_change)
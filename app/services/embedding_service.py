@@ -1,23 +1,28 @@
 from app.db.handler import QueryExecutor
 from app.sql import user_queries
+from app.config import settings
+from app.core.embedding_codec import decode_embedding, encode_embedding
+from app.services.embeddingChanges_service import publish_embedding_added
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from typing import  Any, Optional
+from typing import  Any, List, Optional
 from app.models.base import Nhandien,Nguoidung
+import numpy as np
 
-def get_embedding_by_id(db: Session,maso: str)->Optional[str]:
+def get_embedding_by_id(db: Session,maso: str)->List[np.ndarray]:
     """
     Get embedding by ID
     """
-    
-    return db.query(Nhandien.embedding_vector).filter(Nhandien.nguoi_dung_id  == maso).scalar()
+    rows = db.query(Nhandien.embedding_vector).filter(Nhandien.nguoi_dung_id  == maso).all()
+    return [decode_embedding(embedding_vector) for (embedding_vector,) in rows]
 
-def insert_new_embedding(db: Session,maso: str,embedding_vector:str,quality_score:float)->Optional[Any]:
+def insert_new_embedding(db: Session,maso: str,embedding:np.ndarray,quality_score:float)->Optional[Any]:
     """
-    Insert new embedding
+    Insert new embedding (lưu dạng nhị phân có header)
     """
     newEmbedding=Nhandien(
         nguoi_dung_id= maso,
-        embedding_vector = embedding_vector,
+        embedding_vector = encode_embedding(embedding, settings.EMBEDDING_STORAGE_DTYPE),
         danh_gia = quality_score
     )
 
@@ -25,11 +30,38 @@ def insert_new_embedding(db: Session,maso: str,embedding_vector:str,quality_scor
     db.commit()
     db.refresh(newEmbedding)
 
+    ho_ten = newEmbedding.nguoi_dung.ho_ten if newEmbedding.nguoi_dung is not None else None
+    publish_embedding_added(newEmbedding.id, maso, ho_ten, embedding, quality_score)
+
+    return newEmbedding
+
 def verification_identity(db:Session,predicted_label:str) -> Optional[Any]:
-    return db.query(Nguoidung.ho_ten,Nhandien.embedding_vector,Nguoidung.ma_so,Nhandien.danh_gia).join(Nhandien,Nguoidung.ma_so==Nhandien.nguoi_dung_id).filter(Nguoidung.ma_so == predicted_label).all()
+    rows = db.query(Nguoidung.ho_ten,Nhandien.embedding_vector,Nguoidung.ma_so,Nhandien.danh_gia).join(Nhandien,Nguoidung.ma_so==Nhandien.nguoi_dung_id).filter(Nguoidung.ma_so == predicted_label).all()
+    return [(ho_ten, decode_embedding(embedding_vector), ma_so, danh_gia) for ho_ten, embedding_vector, ma_so, danh_gia in rows]
 
 def verification_All(db:Session)-> Optional[Any]:
-    return db.query(Nguoidung.ho_ten,Nhandien.embedding_vector,Nguoidung.ma_so,Nhandien.danh_gia).join(Nhandien,Nguoidung.ma_so==Nhandien.nguoi_dung_id).all()
+    rows = db.query(Nguoidung.ho_ten,Nhandien.embedding_vector,Nguoidung.ma_so,Nhandien.danh_gia).join(Nhandien,Nguoidung.ma_so==Nhandien.nguoi_dung_id).all()
+    return [(ho_ten, decode_embedding(embedding_vector), ma_so, danh_gia) for ho_ten, embedding_vector, ma_so, danh_gia in rows]
+
+def get_all_embeddings(db:Session)-> Optional[Any]:
+    """
+    Lấy toàn bộ embedding kèm nhandien.id để build index
+    Trả về raw embedding_vector, caller tự decode từng dòng
+    """
+    return db.query(Nhandien.id,Nguoidung.ho_ten,Nhandien.embedding_vector,Nguoidung.ma_so,Nhandien.danh_gia).join(Nhandien,Nguoidung.ma_so==Nhandien.nguoi_dung_id).all()
+
+def get_embeddings_after(db:Session,last_id:int)-> Optional[Any]:
+    """
+    Lấy các embedding có nhandien.id > last_id (catch-up cho index đã persist)
+    """
+    return db.query(Nhandien.id,Nguoidung.ho_ten,Nhandien.embedding_vector,Nguoidung.ma_so,Nhandien.danh_gia).join(Nhandien,Nguoidung.ma_so==Nhandien.nguoi_dung_id).filter(Nhandien.id > last_id).order_by(Nhandien.id).all()
+
+def get_embedding_fingerprint(db:Session)-> tuple:
+    """
+    (số embedding, nhandien.id lớn nhất) - dùng để kiểm tra index persist còn khớp database
+    """
+    count, max_id = db.query(func.count(Nhandien.id),func.max(Nhandien.id)).select_from(Nhandien).join(Nguoidung,Nguoidung.ma_so==Nhandien.nguoi_dung_id).one()
+    return int(count or 0), int(max_id or 0)
 
 def get_person_emmbedding(executor: QueryExecutor)-> dict:
-    return executor.execute_query(user_queries.GET_PERSON_EMMBEDING)
\ No newline at end of file
+    return executor.execute_query(user_queries.GET_PERSON_EMMBEDING)
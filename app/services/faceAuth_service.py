@@ -1,19 +1,129 @@
-from app.services.faceRecognition_service import FaceRecognitionSystem
+from app.services.faceRecognition_service import face_system
+from app.services.inferenceBatcher_service import face_batcher
+from app.services.inferenceExecutor_service import inference_executor
+from app.services.faceTracker_service import create_face_tracker
+from app.services.verificationScheduler_service import LoadAwareIntervalPolicy, verification_scheduler
 from app.schemas.face import AuthStatusResponse
+from app.config import settings
+from abc import ABC, abstractmethod
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Deque, Dict, List, Optional
 import asyncio
-from deepface import DeepFace
+import numpy as np
 
 
+class FaceVerifier(ABC):
+    """
+    Interface backend verification cho continuous auth
+    represent_face(): embedding của một face crop đã detect bằng YOLO (không detect lại)
+    distance(): càng nhỏ càng giống, so với các ngưỡng của backend
+    """
+    name = "base"
+
+    # Ngưỡng distance: pass <= base_threshold (giảm dần theo fraud_score, không thấp hơn min_threshold),
+    # nghi ngờ <= suspicious_threshold, lớn hơn là fraud
+    base_threshold = 0.4
+    min_threshold = 0.3
+    suspicious_threshold = 0.6
+
+    @abstractmethod
+    def represent_face(self, face_image: np.ndarray) -> np.ndarray:
+        """Embedding của face crop (chạy trên thread inference)"""
+
+    async def embed(self, face_image: np.ndarray) -> np.ndarray:
+        """represent_face() trên inference executor"""
+        return await inference_executor.run(self.represent_face, face_image)
+
+    def distance(self, references: np.ndarray, embedding: np.ndarray) -> np.ndarray:
+        """Cosine distance từ embedding tới từng hàng của references"""
+        norms = np.linalg.norm(references, axis=1) * np.linalg.norm(embedding)
+        norms[norms == 0] = 1.0
+        return 1.0 - (references @ embedding) / norms
+
+
+class FaceNetVerifier(FaceVerifier):
+    """Dùng lại pipeline YOLO + FaceNet của login - không cần load thêm model"""
+    name = "facenet"
+
+    # Calibrate theo FaceRecognitionSystem.verification_threshold (similarity 0.55 <=> distance 0.45)
+    base_threshold = 0.45
+    min_threshold = 0.35
+    suspicious_threshold = 0.6
+
+    def __init__(self, face_system, face_batcher):
+        self.face_system = face_system
+        self.face_batcher = face_batcher
+
+    def represent_face(self, face_image: np.ndarray) -> np.ndarray:
+        embedding = self.face_system.extract_embedding(face_image)
+        if embedding is None:
+            raise ValueError("Failed to extract face features")
+        return embedding
+
+    async def embed(self, face_image: np.ndarray) -> np.ndarray:
+        # Gom batch FaceNet với các session / request khác
+        embedding = (await self.face_batcher.embed([face_image]))[0]
+        if embedding is None:
+            raise ValueError("Failed to extract face features")
+        return embedding
+
+
+class DeepFaceVerifier(FaceVerifier):
+    """DeepFace (mặc định VGG-Face) - load thêm TensorFlow weights riêng"""
+    name = "deepface"
+
+    # DeepFace default threshold
+    base_threshold = 0.4
+    min_threshold = 0.3
+    suspicious_threshold = 0.6
+
+    def __init__(self, model_name: str = "VGG-Face"):
+        self.model_name = model_name
+
+    def represent_face(self, face_image: np.ndarray) -> np.ndarray:
+        # Import lazy: chỉ load DeepFace khi backend này được chọn
+        from deepface import DeepFace
+        # Crop đã được YOLO detect -> bỏ qua detector backend của DeepFace
+        representation = DeepFace.represent(
+            img_path=face_image,
+            model_name=self.model_name,
+            detector_backend="skip",
+            enforce_detection=False
+        )
+        return np.asarray(representation[0]["embedding"], dtype=np.float32)
+
+
+def create_face_verifier(backend: str) -> FaceVerifier:
+    """Chọn verifier backend theo config (facenet | deepface)"""
+    backend = (backend or "facenet").strip().lower()
+    if backend == "facenet":
+        return FaceNetVerifier(face_system, face_batcher)
+    if backend == "deepface":
+        return DeepFaceVerifier()
+    raise ValueError(f"Unknown continuous auth verifier backend: {backend}")
+
 
 class ContinuousAuthManager:
     def __init__(self):
         # Lưu trữ thông tin session và baseline
         self.user_sessions: Dict[int, Dict] = {}
-        self.user_baselines: Dict[int, List[float]] = {}
+        self.user_baselines: Dict[int, np.ndarray] = {}     # account_id -> baseline embedding
+        self.recent_embeddings: Dict[int, Deque[np.ndarray]] = {}  # account_id -> embedding đã verify gần đây
         self.verification_schedule: Dict[int, Dict] = {}
-        self.face_system = FaceRecognitionSystem()
+        self.face_system = face_system
+        self.face_batcher = face_batcher
+        self.face_tracker = create_face_tracker(face_system)  # account_id -> box + signature lần verify trước
+        self.verifier = create_face_verifier(settings.CONTINUOUS_AUTH_VERIFIER)
+        self.verification_scheduler = verification_scheduler
+        # Giãn interval của session rủi ro thấp khi inference quá tải
+        self.interval_policy = LoadAwareIntervalPolicy(
+            queue_depth=lambda: inference_executor.queue_depth + face_batcher.queue_depth,
+            latency_p95=lambda: inference_executor.latency_percentile(95),
+            queue_target=settings.VERIFICATION_LOAD_QUEUE_TARGET,
+            p95_target_ms=settings.VERIFICATION_LOAD_P95_TARGET_MS,
+            max_stretch=settings.VERIFICATION_LOAD_MAX_STRETCH,
+        )
     
     async def initialize_session(
         self, 
@@ -26,8 +136,22 @@ class ContinuousAuthManager:
         Khởi tạo session xác thực liên tục
         """
         try:
+            # Detect MỘT lần, dùng chung crop cho authenticate và baseline embedding
+            faces = await self.face_batcher.detect(baseline_image)
+            
+            # Baseline phải là khuôn mặt duy nhất trong frame, không ghim nhầm người khác làm baseline
+            if len(faces) > 1:
+                return {
+                    "success": False,
+                    "message": "Multiple faces detected. Please ensure only one face is visible"
+                }
+            
+            embeddings = await self.face_batcher.embed([face['face_image'] for face in faces])
+            
             # Tạo baseline encoding - đảm bảo user đúng danh tính
-            baseline_result = self.face_system.authenticate_face(db, baseline_image)
+            baseline_result = await inference_executor.run(
+                self.face_system.authenticate_detected, db, faces, embeddings
+            )
             
             if not baseline_result.get("success"):
                 return {
@@ -35,10 +159,22 @@ class ContinuousAuthManager:
                     "message": baseline_result
                 }
             
-            # Lưu baseline và khởi tạo session
-            #baselineEmbedding = self.face_system.extract_embedding(baseline_image)
-            #self.user_baselines[account_id] = baselineEmbedding
-            self.user_baselines[account_id] = baseline_image
+            # Tính baseline embedding MỘT lần, không giữ ảnh gốc trong bộ nhớ
+            try:
+                if self.verifier.name == FaceNetVerifier.name and embeddings[0] is not None:
+                    baseline_embedding = embeddings[0]
+                else:
+                    baseline_embedding = await self.verifier.embed(faces[0]['face_image'])
+            except Exception as e:
+                return {
+                    "success": False,
+                    "message": f"Failed to extract baseline embedding: {e}"
+                }
+            
+            self.user_baselines[account_id] = baseline_embedding
+            self.face_tracker.update(account_id, baseline_image, faces[0])
+            self.face_tracker.record_frame(account_id, full_frame=True)
+            self.recent_embeddings[account_id] = deque(maxlen=settings.CONTINUOUS_AUTH_RECENT_EMBEDDINGS)
 
             session_token = f"session_{account_id}_{datetime.utcnow().timestamp()}"
 
@@ -138,26 +274,45 @@ class ContinuousAuthManager:
         if verification_image is None:
             return await self._handle_technical_failure(account_id, "no_face_detected")
         
-        faces = FaceRecognitionSystem().detect_faces(verification_image)
+        # Mặt vẫn ổn định tại box cũ -> bỏ qua YOLO (không áp dụng cho frame tới hạn detect toàn frame)
+        faces = self.face_tracker.track(account_id, verification_image)
+        
+        if faces is None:
+            # Học sinh ngồi yên -> detect quanh box lần trước, cứ DETECTION_ROI_FULL_FRAME_EVERY frame
+            # (tính cả frame tracked) detect toàn frame một lần để bắt người thứ hai
+            roi = None if self.face_tracker.full_frame_due(account_id) else self.face_tracker.last_box(account_id)
+            faces = await self.face_batcher.detect(verification_image, roi)
+            self.face_tracker.record_frame(account_id, full_frame=roi is None)
+            if len(faces) == 1:
+                self.face_tracker.update(account_id, verification_image, faces[0])
+        else:
+            self.face_tracker.record_frame(account_id, full_frame=False)
 
          # không detect được khuôn mặt
         if len(faces) == 0:
+            self.face_tracker.drop(account_id)
             return await self._handle_technical_failure(account_id, "similarity_calculation_failed")
         
         # # 2 người được nhận diện
         if len(faces) > 1:
+            self.face_tracker.drop(account_id)
             return await self._handle_verification_failure(account_id, "high_similarity")
         
-        baseline_embedding = self.user_baselines[account_id]
         try:
-            #similarity_score = self.face_system.calculate_similarity(baseline_embedding, current_embedding)
+            # Chỉ embed face crop của frame mới (không detect lại), baseline đã được cache từ initialize_session
+            current_embedding = await self.verifier.embed(faces[0]['face_image'])
+            
             # Số càng nhỏ càng giống
-            similarity_score = DeepFace.verify(img1_path = baseline_embedding, img2_path = verification_image,model_name="VGG-Face")['distance']
+            similarity_score = self._distance_to_references(account_id, current_embedding)
         
             # Phân tích kết quả verification
             verification_result  = await self._analyze_verification_result(account_id, similarity_score)
             
             if verification_result["success"]:
+                # Giữ embedding vừa pass để chịu được thay đổi nhỏ (ánh sáng, góc mặt) theo thời gian
+                recent = self.recent_embeddings.get(account_id)
+                if recent is not None and recent.maxlen:
+                    recent.append(current_embedding)
                 await self._handle_successful_verification(account_id, similarity_score)
             else:
                 await self._handle_verification_failure(account_id, verification_result["reason"])
@@ -218,6 +373,21 @@ class ContinuousAuthManager:
     #             "reason": "low_similarity",
     #             "message": f"Potential fraud detected (similarity: {similarity_score:.3f})"
     #         }
+    def _distance_to_references(self, account_id: int, embedding: np.ndarray) -> float:
+        """
+        Cosine distance nhỏ nhất tới baseline và các embedding đã verify gần đây
+        (cùng metric với DeepFace.verify mặc định)
+        Embedding gần đây chỉ được tính khi frame vẫn trong suspicious_threshold so với baseline,
+        tránh identity trôi dần khỏi khuôn mặt đã đăng ký
+        """
+        recent = self.recent_embeddings.get(account_id, ())
+        references = np.vstack([self.user_baselines[account_id], *recent])
+        distances = self.verifier.distance(references, embedding)
+        baseline_distance = float(distances[0])
+        if baseline_distance > self.verifier.suspicious_threshold:
+            return baseline_distance
+        return float(distances.min())
+
     async def _analyze_verification_result(self, account_id: int, distance: float) -> Dict:
         """
         Phân tích kết quả verification dựa trên distance (càng nhỏ càng giống)
@@ -228,9 +398,9 @@ class ContinuousAuthManager:
         
         session = self.user_sessions[account_id]
         
-        # Threshold cho distance (càng nhỏ càng strict)
-        base_threshold = 0.4  # DeepFace default threshold
-        adjusted_threshold = max(0.3, base_threshold - (session["fraud_score"] * 0.1))
+        # Threshold cho distance (càng nhỏ càng strict) - calibrate theo verifier backend
+        base_threshold = self.verifier.base_threshold
+        adjusted_threshold = max(self.verifier.min_threshold, base_threshold - (session["fraud_score"] * 0.1))
         
         if distance <= adjusted_threshold:
             # Verification thành công
@@ -244,7 +414,7 @@ class ContinuousAuthManager:
                 "message": f"Verification successful (distance: {distance:.3f})"
             }
         
-        elif distance <= 0.6:
+        elif distance <= self.verifier.suspicious_threshold:
             # Nghi ngờ
             fraud_score = min(1.0, session["fraud_score"] + 0.2)
             return {
@@ -371,12 +541,20 @@ class ContinuousAuthManager:
         else:
             interval = 60  # Verify mỗi 60s - clean
         
+        # Quá tải -> giãn interval theo risk level (critical / high giữ nhịp)
+        risk_level = self._get_risk_level(fraud_score)
+        interval, load_decision = self.interval_policy.interval(interval, risk_level)
+        
         self.verification_schedule[account_id] = {
-            "interval": interval,
+            "interval": int(round(interval)),
             "last_update": datetime.utcnow(),
-            "risk_level": self._get_risk_level(fraud_score),
-            "fraud_score": fraud_score
+            "risk_level": risk_level,
+            "fraud_score": fraud_score,
+            "load": load_decision
         }
+
+        # Server push verify_now khi tới hạn
+        self.verification_scheduler.schedule(account_id, self.verification_schedule[account_id]["interval"])
     
     def _get_risk_level(self, fraud_score: float) -> str:
         """Xác định risk level dựa trên fraud score"""
@@ -416,6 +594,9 @@ class ContinuousAuthManager:
         del self.user_sessions[account_id]
         if account_id in self.user_baselines:
             del self.user_baselines[account_id]
+        self.recent_embeddings.pop(account_id, None)
+        self.face_tracker.drop(account_id)
+        self.verification_scheduler.cancel(account_id)
         if account_id in self.verification_schedule:
             del self.verification_schedule[account_id]
         
@@ -424,4 +605,7 @@ class ContinuousAuthManager:
             "success": True,
             "message": "Session ended successfully",
             "session_report": session_report
-        }
\ No newline at end of file
+        }
+
+# Global manager - dùng chung cho HTTP endpoint và WebSocket binary frame
+continuous_auth_manager = ContinuousAuthManager()
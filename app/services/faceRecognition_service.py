@@ -2,10 +2,11 @@ import base64
 import io
 import json
 import os
-from app.services.embedding_service import get_embedding_by_id, insert_new_embedding, verification_identity, verification_All
-from keras_facenet import FaceNet
-from ultralytics import YOLO
-import joblib
+from app.services.embedding_service import get_embedding_by_id, insert_new_embedding
+from app.services.embeddingIndex_service import embedding_index
+from app.services.svmScorer_service import svm_scorer
+from app.services.modelRegistry_service import model_registry
+from app.config import settings
 import cv2
 import numpy as np
 from scipy.spatial.distance import cosine
@@ -22,13 +23,7 @@ current_dir = os.path.dirname(current_file)
 class FaceRecognitionSystem:
     def __init__(self):
         """Initialize với enhanced configuration"""
-        # Load models
-        model_file = os.path.join(current_dir, "..", "assets", "yolov11n-face.pt")
-        svm_file = os.path.join(current_dir, "..", "assets", "svm_facenet_18.pkl")
-
-        self.face_detector = YOLO(model_file) # phát hiện khuôn mặt
-        self.embedder = FaceNet() # trích xuất embedding
-        self.svm_model = joblib.load(svm_file) # phân loại ai là ai (dựa trên embedding)
+        # Models lấy từ model_registry (load một lần/process, lazy)
         
         # Thresholds với fine-tuning
         self.verification_threshold = 0.55
@@ -46,6 +41,21 @@ class FaceRecognitionSystem:
         
         # Embedding normalization cache
         self._embedding_norm_cache = {}
+    
+    @property
+    def face_detector(self):
+        """YOLO face detector dùng chung"""
+        return model_registry.get("face_detector")
+    
+    @property
+    def embedder(self):
+        """FaceNet embedder dùng chung"""
+        return model_registry.get("face_embedder")
+    
+    @property
+    def svm_model(self):
+        """SVM classifier dùng chung"""
+        return model_registry.get("svm")
         
     def preprocess_face(self, face_img: np.ndarray) -> Optional[np.ndarray]:
         """EXACT replication của training pipeline preprocessing"""
@@ -62,139 +72,258 @@ class FaceRecognitionSystem:
             logger.error(f"Face preprocessing failed: {e}")
             return None
     
-    def detect_faces(self, image: np.ndarray) -> List[Dict[str, Any]]:
+    def detect_faces(
+        self,
+        image: np.ndarray,
+        roi: Optional[Tuple[int, int, int, int]] = None,
+        pixel_scale: float = 1.0
+    ) -> List[Dict[str, Any]]:
         """Enhanced face detection với quality filtering"""
+        return self.detect_faces_batch([image], [roi], [pixel_scale])[0]
+    
+    def detect_faces_batch(
+        self,
+        images: List[np.ndarray],
+        rois: Optional[List[Optional[Tuple[int, int, int, int]]]] = None,
+        pixel_scales: Optional[List[float]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Face detection cho nhiều ảnh trong MỘT lần YOLO inference
+        rois: box mặt trước đó của cùng session -> chỉ detect trong vùng quanh box,
+              không thấy mặt thì detect lại trên toàn frame
+        pixel_scales: số pixel ảnh gốc trên một pixel của ảnh đưa vào (ảnh decode IMREAD_REDUCED_*),
+              min_face_size và quality size được tính theo độ phân giải gốc
+        """
+        results: List[List[Dict[str, Any]]] = [[] for _ in images]
+        rois = rois or [None] * len(images)
+        pixel_scales = pixel_scales or [1.0] * len(images)
         try:
             start_time = time.time()
             
             # Validate input
-            if image is None or not isinstance(image, np.ndarray):
-                raise ValueError("Invalid image input")
+            valid_positions = []
+            for idx, image in enumerate(images):
+                if image is None or not isinstance(image, np.ndarray):
+                    logger.error(f"Face detection error: Invalid image input at position {idx}")
+                    continue
+                valid_positions.append(idx)
             
-            # Run YOLO detection
-            detections = self.face_detector(image, verbose=False)[0]
-            faces = []
+            if not valid_positions:
+                return results
             
-            if detections.boxes is None:
-                return faces
+            # Run YOLO detection (ROI nếu có)
+            self._run_detector(images, rois, pixel_scales, valid_positions, results)
             
-            for box in detections.boxes:
-                # Extract coordinates safely
-                coords = box.xyxy[0].cpu().numpy()
-                x1, y1, x2, y2 = map(int, coords)
-                confidence = float(box.conf[0].cpu().numpy())
-                
-                # Skip low confidence detections
-                if confidence < self.face_confidence_threshold:
-                    continue
-                
-                # Validate bounding box
-                if x2 <= x1 or y2 <= y1:
-                    continue
-                
-                # Clamp coordinates to image bounds
-                h, w = image.shape[:2]
-                x1 = max(0, min(x1, w-1))
-                y1 = max(0, min(y1, h-1))
-                x2 = max(x1+1, min(x2, w))
-                y2 = max(y1+1, min(y2, h))
-                
-                # Check minimum face size
-                face_width = x2 - x1
-                face_height = y2 - y1
-                if face_width < self.min_face_size or face_height < self.min_face_size:
-                    logger.debug(f"Face too small: {face_width}x{face_height}")
-                    continue
-                
-                # Extract face ROI with padding for better alignment
-                padding = int(min(face_width, face_height) * 0.1)
-                x1_pad = max(0, x1 - padding)
-                y1_pad = max(0, y1 - padding)
-                x2_pad = min(w, x2 + padding)
-                y2_pad = min(h, y2 + padding)
-                
-                face_roi = image[y1_pad:y2_pad, x1_pad:x2_pad]
-                
-                # Skip invalid ROIs
-                if face_roi.size == 0:
-                    continue
-                
-                # Calculate face quality metrics
-                brightness = np.mean(face_roi)
-                contrast = np.std(face_roi)
-                
-                faces.append({
-                    'bbox': (x1, y1, x2, y2),
-                    'bbox_padded': (x1_pad, y1_pad, x2_pad, y2_pad),
-                    'confidence': confidence,
-                    'face_image': face_roi,
-                    'quality_metrics': {
-                        'brightness': brightness,
-                        'contrast': contrast,
-                        'size': (face_width, face_height)
-                    }
-                })
+            # ROI không thấy mặt -> chạy lại trên toàn frame
+            lost_positions = [idx for idx in valid_positions if rois[idx] is not None and not results[idx]]
+            if lost_positions:
+                self._run_detector(images, [None] * len(images), pixel_scales, lost_positions, results)
             
             detection_time = time.time() - start_time
-            logger.debug(f"Detected {len(faces)} faces in {detection_time:.3f}s")
-            
-            # Sort by confidence
-            faces.sort(key=lambda x: x['confidence'], reverse=True)
+            logger.debug(f"Detected faces in {len(valid_positions)} image(s) in {detection_time:.3f}s")
             
-            return faces
+            return results
             
         except Exception as e:
             logger.error(f"Face detection error: {str(e)}")
             import traceback
             traceback.print_exc()
-            return []
+            return [[] for _ in images]
+    
+    def _run_detector(self, images, rois, pixel_scales, positions, results) -> None:
+        """Một lần YOLO trên các ảnh đã crop ROI / thu nhỏ, map box về toàn frame"""
+        prepared = [self._prepare_detector_input(images[idx], rois[idx]) for idx in positions]
+        
+        # DETECTION_INFERENCE_SIZE = 0: không thu nhỏ, để YOLO dùng imgsz mặc định của model
+        detector_kwargs = {"verbose": False}
+        if settings.DETECTION_INFERENCE_SIZE:
+            detector_kwargs["imgsz"] = settings.DETECTION_INFERENCE_SIZE
+        
+        # YOLO predictor không thread-safe: batcher và register_face có thể gọi cùng lúc từ các thread của pool
+        with model_registry.inference_lock("face_detector"):
+            batch_detections = self.face_detector(
+                [detector_input for detector_input, _, _ in prepared],
+                **detector_kwargs
+            )
+        
+        for idx, (_, scale, offset), detections in zip(positions, prepared, batch_detections):
+            results[idx] = self._parse_detections(images[idx], detections, scale, offset, pixel_scales[idx])
+    
+    def _prepare_detector_input(
+        self,
+        image: np.ndarray,
+        roi: Optional[Tuple[int, int, int, int]]
+    ) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+        """
+        Crop vùng quanh ROI (có padding) và thu nhỏ về DETECTION_INFERENCE_SIZE
+        Trả về (ảnh cho detector, scale, offset (x, y) của vùng crop trong frame gốc)
+        """
+        h, w = image.shape[:2]
+        offset = (0, 0)
+        region = image
+        
+        if roi is not None:
+            x1, y1, x2, y2 = roi
+            pad_x = int((x2 - x1) * settings.DETECTION_ROI_PADDING)
+            pad_y = int((y2 - y1) * settings.DETECTION_ROI_PADDING)
+            rx1, ry1 = max(0, x1 - pad_x), max(0, y1 - pad_y)
+            rx2, ry2 = min(w, x2 + pad_x), min(h, y2 + pad_y)
+            if rx2 > rx1 and ry2 > ry1:
+                region = image[ry1:ry2, rx1:rx2]
+                offset = (rx1, ry1)
+        
+        scale = 1.0
+        longest = max(region.shape[:2])
+        if settings.DETECTION_INFERENCE_SIZE and longest > settings.DETECTION_INFERENCE_SIZE:
+            scale = settings.DETECTION_INFERENCE_SIZE / longest
+            region = cv2.resize(region, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        
+        return region, scale, offset
+    
+    def _parse_detections(
+        self,
+        image: np.ndarray,
+        detections,
+        scale: float = 1.0,
+        offset: Tuple[int, int] = (0, 0),
+        pixel_scale: float = 1.0
+    ) -> List[Dict[str, Any]]:
+        """Lọc YOLO boxes theo confidence/size và cắt face ROI trên ảnh độ phân giải gốc"""
+        faces = []
+        
+        if detections.boxes is None:
+            return faces
+        
+        for box in detections.boxes:
+            # Extract coordinates safely, map về toàn frame
+            coords = box.xyxy[0].cpu().numpy() / scale
+            x1, y1, x2, y2 = map(int, coords + np.array([offset[0], offset[1], offset[0], offset[1]]))
+            confidence = float(box.conf[0].cpu().numpy())
+            
+            # Skip low confidence detections
+            if confidence < self.face_confidence_threshold:
+                continue
+            
+            # Validate bounding box
+            if x2 <= x1 or y2 <= y1:
+                continue
+            
+            face = self.crop_face(image, (x1, y1, x2, y2), confidence, pixel_scale)
+            if face is not None:
+                faces.append(face)
+        
+        # Sort by confidence
+        faces.sort(key=lambda x: x['confidence'], reverse=True)
+        
+        return faces
+    
+    def crop_face(
+        self,
+        image: np.ndarray,
+        bbox: Tuple[int, int, int, int],
+        confidence: float,
+        pixel_scale: float = 1.0
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Cắt face ROI (có padding) + quality metrics cho một box, None nếu box không hợp lệ
+        pixel_scale: ảnh đã thu nhỏ khi decode -> kiểm tra min_face_size / báo size theo độ phân giải gốc
+        """
+        x1, y1, x2, y2 = bbox
+        
+        # Clamp coordinates to image bounds
+        h, w = image.shape[:2]
+        x1 = max(0, min(x1, w-1))
+        y1 = max(0, min(y1, h-1))
+        x2 = max(x1+1, min(x2, w))
+        y2 = max(y1+1, min(y2, h))
+        
+        # Check minimum face size (theo pixel ảnh gốc)
+        face_width = x2 - x1
+        face_height = y2 - y1
+        if face_width * pixel_scale < self.min_face_size or face_height * pixel_scale < self.min_face_size:
+            logger.debug(f"Face too small: {face_width}x{face_height}")
+            return None
+        
+        # Extract face ROI with padding for better alignment
+        padding = int(min(face_width, face_height) * 0.1)
+        x1_pad = max(0, x1 - padding)
+        y1_pad = max(0, y1 - padding)
+        x2_pad = min(w, x2 + padding)
+        y2_pad = min(h, y2 + padding)
+        
+        face_roi = image[y1_pad:y2_pad, x1_pad:x2_pad]
+        
+        # Skip invalid ROIs
+        if face_roi.size == 0:
+            return None
+        
+        # Calculate face quality metrics
+        brightness = np.mean(face_roi)
+        contrast = np.std(face_roi)
+        
+        return {
+            'bbox': (x1, y1, x2, y2),
+            'bbox_padded': (x1_pad, y1_pad, x2_pad, y2_pad),
+            'confidence': confidence,
+            'face_image': face_roi,
+            'quality_metrics': {
+                'brightness': brightness,
+                'contrast': contrast,
+                'size': (int(face_width * pixel_scale), int(face_height * pixel_scale))
+            }
+        }
     
     def extract_embedding(self, face_image: np.ndarray) -> Optional[np.ndarray]:
-        """Extract embedding với EXACT training pipeline compatibility"""
+        """Extract embedding cho một khuôn mặt (wrapper của extract_embeddings_batch)"""
+        return self.extract_embeddings_batch([face_image])[0]
+    
+    def extract_embeddings_batch(self, face_images: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+        """
+        Extract embedding cho nhiều khuôn mặt trong MỘT lần FaceNet inference
+        Trả về list cùng thứ tự với face_images, None cho face lỗi
+        """
+        results: List[Optional[np.ndarray]] = [None] * len(face_images)
+        
+        # CRITICAL: Use exact same preprocessing as training
+        processed = []
+        positions = []
+        for idx, face_image in enumerate(face_images):
+            face = self.preprocess_face(face_image)
+            if face is not None:
+                processed.append(face)
+                positions.append(idx)
+        
+        if not processed:
+            return results
+        
         try:
-            #start_time = time.time()
-            
-            # CRITICAL: Use exact same preprocessing as training
-            processed = self.preprocess_face(face_image)
-            if processed is None:
-                return None
-            
-            # Log để verify preprocessing output
-            logger.debug(f"Preprocessed face stats: shape={processed.shape}, "
-                        f"dtype={processed.dtype}, "
-                        f"range=[{processed.min():.1f}, {processed.max():.1f}]")
-            
-            # Extract embedding - KHÔNG batch dimension optimization
-            embedding = self.embedder.embeddings(np.expand_dims(processed, axis=0))[0]
-            
-            # CRITICAL: Check embedding characteristics
-            embedding_norm = np.linalg.norm(embedding)
-            logger.debug(f"Raw embedding norm: {embedding_norm:.4f}")
-            
-            # Validate embedding
-            if np.all(embedding == 0) or np.isnan(embedding).any() or np.isinf(embedding).any():
-                logger.error("Invalid embedding detected (zeros/nan/inf)")
-                return None
-            
-            # IMPORTANT: Normalize embedding để ensure consistent similarity
-            # nhưng phải check xem training có normalize không
-            if embedding_norm > 0:
-                embedding_normalized = embedding / embedding_norm
-                
-                # Log both versions để debug
-                logger.debug(f"Normalized embedding: norm={np.linalg.norm(embedding_normalized):.4f}")
-                
-                # Return normalized version
-                return embedding_normalized
-            else:
-                logger.error("Zero norm embedding")
-                return None
+            start_time = time.time()
             
+            # Một tensor (N, 160, 160, 3) - một forward pass
+            batch = np.stack(processed)
+            embeddings = np.asarray(self.embedder.embeddings(batch))
+            
+            logger.debug(f"Extracted {len(processed)} embeddings in {time.time() - start_time:.3f}s")
         except Exception as e:
             logger.error(f"Embedding extraction failed: {e}")
             import traceback
             traceback.print_exc()
-            return None
+            return results
+        
+        # Validate embedding (zeros/nan/inf) cho cả batch
+        norms = np.linalg.norm(embeddings, axis=1)
+        valid = np.isfinite(embeddings).all(axis=1) & np.any(embeddings != 0, axis=1) & (norms > 0)
+        
+        # IMPORTANT: Normalize embedding để ensure consistent similarity
+        normalized = embeddings / np.where(norms > 0, norms, 1.0)[:, None]
+        
+        for row, idx in enumerate(positions):
+            if valid[row]:
+                results[idx] = normalized[row]
+            else:
+                logger.error(f"Invalid embedding detected (zeros/nan/inf) for face {idx}")
+        
+        return results
     
     def calculate_similarity(self, embedding1: np.ndarray, embedding2: np.ndarray) -> float:
         """Enhanced similarity calculation với multiple metrics"""
@@ -245,12 +374,57 @@ class FaceRecognitionSystem:
             faces = self.detect_faces(image)
             logger.info(f"Detected {len(faces)} face(s)")
             
+            if len(faces) == 0:
+                return {"success": False, "message": "No face detected"}
+            
+            # Extract embedding cho tất cả khuôn mặt trong một lần inference
+            embedding_start = time.time()
+            embeddings = self.extract_embeddings_batch([face_data['face_image'] for face_data in faces])
+            embedding_time = time.time() - embedding_start
+            
+            return self.authenticate_detected(db, faces, embeddings, start_time, embedding_time)
+                
+        except Exception as e:
+            logger.error(f"Authentication failed with exception: {e}")
+            import traceback
+            traceback.print_exc()
+            return {
+                "success": False,
+                "message": f"Authentication error: {str(e)}"
+            }
+    
+    def authenticate_detected(
+        self,
+        db: Session,
+        faces: List[Dict[str, Any]],
+        embeddings: List[Optional[np.ndarray]],
+        start_time: Optional[float] = None,
+        embedding_time: float = 0.0
+    ) -> Dict[str, Any]:
+        """SVM Classification + Embedding Verification trên faces/embeddings đã có sẵn"""
+        try:
+            if start_time is None:
+                start_time = time.time()
+            
             if len(faces) == 0:
                 return {"success": False, "message": "No face detected"}
             
             best_match = None
             best_verification_score = 0
             all_results = []  # Store all results for debugging
+
+            # Stage 1: SVM Classification - một lần predict_proba cho mọi face trong frame
+            svm_start = time.time()
+            valid_indices = [idx for idx, embedding in enumerate(embeddings) if embedding is not None]
+            svm_results: Dict[int, Dict[str, Any]] = {}
+            try:
+                scores = svm_scorer.score_batch([embeddings[idx] for idx in valid_indices], k=3)
+                svm_results = dict(zip(valid_indices, scores))
+            except Exception as e:
+                logger.error(f"SVM prediction failed: {e}")
+                import traceback
+                traceback.print_exc()
+            svm_time = time.time() - svm_start
             
             for idx, face_data in enumerate(faces):
                 face_result = {
@@ -259,10 +433,7 @@ class FaceRecognitionSystem:
                     'quality_metrics': face_data['quality_metrics']
                 }
                 
-                # Extract embedding
-                embedding_start = time.time()
-                current_embedding = self.extract_embedding(face_data['face_image'])
-                embedding_time = time.time() - embedding_start
+                current_embedding = embeddings[idx]
                 
                 if current_embedding is None:
                     logger.warning(f"Failed to extract embedding for face {idx}")
@@ -277,39 +448,22 @@ class FaceRecognitionSystem:
                 logger.debug(f"Face {idx} embedding: norm={np.linalg.norm(current_embedding):.4f}, "
                             f"mean={current_embedding.mean():.4f}, std={current_embedding.std():.4f}")
                 
-                # Stage 1: SVM Classification
-                svm_start = time.time()
                 predicted_label = None
                 svm_confidence = 0.0
-                
-                try:
-                    # Ensure correct shape for SVM
-                    embedding_for_svm = current_embedding.reshape(1, -1)
-                    
-                    svm_predictions = self.svm_model.predict(embedding_for_svm)
-                    svm_probabilities = self.svm_model.predict_proba(embedding_for_svm)[0]
-                    
-                    predicted_label = svm_predictions[0]
-                    svm_confidence = float(svm_probabilities.max())
-                    
-                    # Get top 3 predictions for debugging
-                    top_indices = np.argsort(svm_probabilities)[-3:][::-1]
-                    top_predictions = [(self.svm_model.classes_[i], svm_probabilities[i]) 
-                                     for i in top_indices]
-                    
-                    logger.info(f"SVM Top 3: {top_predictions}")
-                    
+
+                svm_result = svm_results.get(idx)
+                if svm_result is not None:
+                    predicted_label = svm_result["label"]
+                    svm_confidence = svm_result["confidence"]
+
+                    # Top 3 predictions for debugging
+                    logger.info(f"SVM Top 3: {svm_result['top_k']}")
+
                     # Filter low-confidence predictions
                     if svm_confidence < self.svm_confidence_threshold:
                         logger.debug(f"SVM confidence too low: {svm_confidence:.3f}")
                         predicted_label = None
-                        
-                except Exception as e:
-                    logger.error(f"SVM prediction failed: {e}")
-                    import traceback
-                    traceback.print_exc()
                 
-                svm_time = time.time() - svm_start
                 face_result['svm_prediction'] = predicted_label
                 face_result['svm_confidence'] = svm_confidence
                 face_result['svm_time'] = svm_time
@@ -317,60 +471,46 @@ class FaceRecognitionSystem:
                 # Stage 2: Embedding Verification
                 verification_start = time.time()
                 
+                embedding_index.ensure_loaded(db)
+
                 if predicted_label:
                     # Focused verification
-                    registered_faces = verification_identity(db, predicted_label)
-                    logger.info(f"Checking {len(registered_faces)} faces for identity: {predicted_label}")
+                    candidate_count = embedding_index.count(predicted_label)
+                    logger.info(f"Checking {candidate_count} faces for identity: {predicted_label}")
                 else:
                     # Fallback to all faces
-                    registered_faces = verification_All(db)
-                    logger.info(f"Checking all {len(registered_faces)} registered faces")
+                    candidate_count = embedding_index.count()
+                    logger.info(f"Checking all {candidate_count} registered faces")
                 
-                if not registered_faces:
+                if not candidate_count:
                     logger.warning("No registered faces found in database")
                     face_result['verification_status'] = 'no_candidates'
                     all_results.append(face_result)
                     continue
                 
-                # Find best embedding match
+                # Find best embedding match - một phép nhân ma trận trên index
+                matches = embedding_index.search(current_embedding, k=5, ma_so=predicted_label or None)
+                similarity_scores = [(match["ho_ten"], match["similarity"]) for match in matches]
+
                 best_embedding_similarity = 0
                 best_candidate = None
-                similarity_scores = []
-               
-                for ho_ten, embedding_json, ma_so, danh_gia in registered_faces:
-                    try:
-                        stored_embedding = np.array(json.loads(embedding_json))
-                        
-                        # Validate stored embedding
-                        if stored_embedding.shape != current_embedding.shape:
-                            logger.error(f"Shape mismatch for {ho_ten}: "
-                                       f"stored={stored_embedding.shape}, current={current_embedding.shape}")
-                            continue
-                        
-                        similarity = self.calculate_similarity(current_embedding, stored_embedding)
-                        similarity_scores.append((ho_ten, similarity))
-                        
-                        if similarity > best_embedding_similarity:
-                            best_embedding_similarity = similarity
-                            best_candidate = {
-                                "username": ho_ten,
-                                "user_id": ma_so,
-                                "embedding_similarity": similarity,
-                                "detection_confidence": face_data['confidence'],
-                                "svm_prediction": predicted_label if predicted_label else "Unknown",
-                                "svm_confidence": svm_confidence,
-                                "quality_score": danh_gia
-                            }
-                            
-                    except Exception as e:
-                        logger.error(f"Error processing {ho_ten}: {e}")
-                        continue
+                if matches and matches[0]["similarity"] > 0:
+                    top_match = matches[0]
+                    best_embedding_similarity = top_match["similarity"]
+                    best_candidate = {
+                        "username": top_match["ho_ten"],
+                        "user_id": top_match["ma_so"],
+                        "embedding_similarity": best_embedding_similarity,
+                        "detection_confidence": face_data['confidence'],
+                        "svm_prediction": predicted_label if predicted_label else "Unknown",
+                        "svm_confidence": svm_confidence,
+                        "quality_score": top_match["danh_gia"]
+                    }
                 
                 verification_time = time.time() - verification_start
                 face_result['verification_time'] = verification_time
                 
                 # Log top matches
-                similarity_scores.sort(key=lambda x: x[1], reverse=True)
                 logger.info(f"Top 5 similarity scores: {similarity_scores[:5]}")
                 face_result['top_matches'] = similarity_scores[:5]
                 
@@ -469,7 +609,7 @@ class FaceRecognitionSystem:
         face_data = faces[0]
         
         # Extract embedding với SAME normalization as authentication
-        embedding = self.extract_embedding(face_data['face_image'])
+        embedding = self.extract_embeddings_batch([face_data['face_image']])[0]
         if embedding is None:
             return {"success": False, "message": "Failed to extract face features"}
         
@@ -502,8 +642,7 @@ class FaceRecognitionSystem:
         existing_embeddings = get_embedding_by_id(db, maso)
         if existing_embeddings:                   
             # Verify against existing embeddings
-            for (embedding_json,) in existing_embeddings:
-                stored_embedding = np.array(json.loads(embedding_json))
+            for stored_embedding in existing_embeddings:
                 
                 # CRITICAL: Normalize stored embedding too
                 stored_norm = np.linalg.norm(stored_embedding)
@@ -520,8 +659,8 @@ class FaceRecognitionSystem:
                     }
         
         # Step 3: Save NORMALIZED embedding
-        embedding_json = json.dumps(embedding.tolist())
-        insert_new_embedding(db, maso, embedding_json, face_data['confidence'])
+        # insert_new_embedding publish thay đổi -> embedding_index của mọi worker tự cập nhật
+        insert_new_embedding(db, maso, embedding, face_data['confidence'])
         
         logger.info(f"Successfully registered face for {maso}")
         
@@ -534,5 +673,9 @@ class FaceRecognitionSystem:
                 "norm": float(np.linalg.norm(embedding)),
                 "dimensions": embedding.shape[0]
             },
-            "note": "Face will be included in future SVM retraining"
-        }
\ No newline at end of file
+            "note": "Face will be included in the next background SVM retraining"
+        }
+
+
+# Shared instance - models thực tế nằm trong model_registry
+face_system = FaceRecognitionSystem()
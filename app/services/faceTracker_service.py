@@ -0,0 +1,126 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+SIGNATURE_SIZE = 32
+
+
+class FaceTrack:
+    """Trạng thái track của một session: box cuối, appearance signature, số frame đã bỏ qua detection"""
+
+    __slots__ = ("bbox", "confidence", "signature", "skipped")
+
+    def __init__(self, bbox: Tuple[int, int, int, int], confidence: float, signature: np.ndarray):
+        self.bbox = bbox
+        self.confidence = confidence
+        self.signature = signature
+        self.skipped = 0
+
+
+class FaceTracker:
+    """
+    Tracker nhẹ cho continuous auth (mỗi session một khuôn mặt):
+    - Sau mỗi lần detect: lưu box + signature (thumbnail grayscale 32x32 đã chuẩn hoá)
+    - Frame mới: so signature tại cùng box (normalized cross-correlation)
+      -> giống: dùng lại box, bỏ qua YOLO; khác (mặt di chuyển / người khác): detect lại
+    - Tối đa TRACK_MAX_SKIP frame liên tiếp không detect, sau đó bắt buộc detect lại
+    - Đếm số frame (cả tracked lẫn ROI) từ lần detect toàn frame gần nhất: tới full_frame_every
+      thì frame đó bắt buộc detect toàn frame (phát hiện người thứ hai), không dùng box cũ
+    """
+
+    def __init__(self, face_system, max_skip: int, min_correlation: float, full_frame_every: int):
+        self.face_system = face_system
+        self.max_skip = max_skip
+        self.min_correlation = min_correlation
+        self.full_frame_every = full_frame_every
+        self._tracks: Dict[int, FaceTrack] = {}
+        self._since_full_frame: Dict[int, int] = {}  # session_id -> số frame từ lần detect toàn frame gần nhất
+
+        self.stats = {
+            "tracked": 0,
+            "lost": 0,
+        }
+
+    def last_box(self, session_id: int) -> Optional[Tuple[int, int, int, int]]:
+        track = self._tracks.get(session_id)
+        return track.bbox if track is not None else None
+
+    def full_frame_due(self, session_id: int) -> bool:
+        """Frame tiếp theo phải detect trên toàn frame (session mới / sau drop cũng tính là tới hạn)"""
+        if self.full_frame_every <= 0:
+            return True
+        since = self._since_full_frame.get(session_id)
+        return since is None or since >= self.full_frame_every - 1
+
+    def record_frame(self, session_id: int, full_frame: bool) -> None:
+        """Ghi nhận một frame đã xử lý (full_frame: đã detect trên toàn frame)"""
+        self._since_full_frame[session_id] = 0 if full_frame else self._since_full_frame.get(session_id, 0) + 1
+
+    def track(self, session_id: int, image: np.ndarray) -> Optional[List[Dict[str, Any]]]:
+        """
+        Thử dùng lại box của frame trước
+        Trả về [face] nếu mặt vẫn ổn định, None nếu cần chạy detector (kể cả khi tới hạn detect toàn frame)
+        """
+        track = self._tracks.get(session_id)
+        if track is None or track.skipped >= self.max_skip or self.full_frame_due(session_id):
+            return None
+
+        signature = _signature(image, track.bbox)
+        if signature is None or float(np.dot(signature, track.signature)) < self.min_correlation:
+            self.stats["lost"] += 1
+            return None
+
+        face = self.face_system.crop_face(image, track.bbox, track.confidence)
+        if face is None:
+            return None
+
+        track.skipped += 1
+        self.stats["tracked"] += 1
+        face["tracked"] = True
+        return [face]
+
+    def update(self, session_id: int, image: np.ndarray, face: Dict[str, Any]) -> None:
+        """Khởi tạo lại track từ kết quả detect"""
+        signature = _signature(image, face["bbox"])
+        if signature is None:
+            self.drop(session_id)
+            return
+        self._tracks[session_id] = FaceTrack(face["bbox"], face["confidence"], signature)
+
+    def drop(self, session_id: int) -> None:
+        self._tracks.pop(session_id, None)
+        self._since_full_frame.pop(session_id, None)
+
+
+def _signature(image: np.ndarray, bbox: Tuple[int, int, int, int]) -> Optional[np.ndarray]:
+    """Thumbnail grayscale của vùng box, zero-mean / unit-norm (dot product = correlation)"""
+    x1, y1, x2, y2 = bbox
+    region = image[max(0, y1):y2, max(0, x1):x2]
+    if region.size == 0:
+        return None
+
+    if region.ndim == 3:
+        region = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+    thumbnail = cv2.resize(region, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA)
+
+    signature = thumbnail.astype(np.float32).ravel()
+    signature -= signature.mean()
+    norm = np.linalg.norm(signature)
+    if norm == 0:
+        return None
+    return signature / norm
+
+
+def create_face_tracker(face_system) -> FaceTracker:
+    return FaceTracker(
+        face_system,
+        max_skip=settings.TRACK_MAX_SKIP,
+        min_correlation=settings.TRACK_MIN_CORRELATION,
+        full_frame_every=settings.DETECTION_ROI_FULL_FRAME_EVERY,
+    )
@@ -2,6 +2,7 @@ from sqlalchemy.orm import Session
 from typing import Optional
 from app.models.base import Nhandien
 from sqlalchemy import text
+from app.services.embeddingChanges_service import publish_embeddings_removed, publish_person_updated
 
 def get_identify_service(db: Session)-> str:
     try:
@@ -24,6 +25,7 @@ def update_face_service(db:Session, nguoi_dung_id: str,duong_dan_anh:str ):
         # Commit thay đổi vào database
         db.commit()
         db.refresh(existing_account)
+        publish_person_updated(nguoi_dung_id, duong_dan_anh=duong_dan_anh)
         return existing_account
     except Exception as e:
         # Rollback nếu có lỗi
@@ -41,6 +43,7 @@ def delete_identify_service(db:Session, id: int) -> Optional[int]:
     try:
         db.delete(dbIdentifyById)
         db.commit()
+        publish_embeddings_removed([id])
 
         return id
     except:
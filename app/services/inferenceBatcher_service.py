@@ -0,0 +1,177 @@
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services.faceRecognition_service import face_system
+from app.services.inferenceExecutor_service import inference_executor
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class MicroBatcher:
+    """
+    Hàng đợi inference gom request từ nhiều coroutine:
+    - Chờ tối đa max_wait_ms hoặc đến khi đủ max_batch_size
+    - Chạy batch_fn MỘT lần cho cả batch trên inference executor
+    - Trả kết quả về đúng future của từng request
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int,
+        max_wait_ms: float
+    ):
+        self.name = name
+        self._batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.stats = {
+            "batches": 0,
+            "items": 0,
+            "max_batch_seen": 0,
+        }
+
+    def _ensure_started(self) -> None:
+        """Khởi tạo queue và worker task trên event loop hiện tại (lazy)"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def submit(self, item: Any) -> Any:
+        """Gửi một item vào hàng đợi và chờ kết quả của riêng item đó"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _collect_batch(self) -> List[Tuple[Any, asyncio.Future]]:
+        """Lấy item đầu tiên rồi gom thêm cho đến khi đầy batch hoặc hết thời gian chờ"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # Lấy ngay những item đã có sẵn trong queue
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect_batch()
+
+            # Bỏ qua request đã bị huỷ (client disconnect)
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            items = [item for item, _ in batch]
+            try:
+                results = await inference_executor.run(self._batch_fn, items)
+            except Exception as e:
+                logger.error(f"{self.name} batch inference failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.stats["batches"] += 1
+            self.stats["items"] += len(batch)
+            self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(batch))
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+class FaceInferenceBatcher:
+    """Micro-batching YOLO detection + FaceNet embedding cho một FaceRecognitionSystem"""
+
+    def __init__(self, face_system):
+        self.face_system = face_system
+        self.detector = MicroBatcher(
+            "face_detection",
+            self._detect_batch,
+            settings.INFERENCE_MAX_BATCH_SIZE,
+            settings.INFERENCE_MAX_WAIT_MS,
+        )
+        self.embedder = MicroBatcher(
+            "face_embedding",
+            self._embed_batch,
+            settings.INFERENCE_MAX_BATCH_SIZE,
+            settings.INFERENCE_MAX_WAIT_MS,
+        )
+
+    async def detect(
+        self,
+        image: np.ndarray,
+        roi: Optional[Tuple[int, int, int, int]] = None,
+        pixel_scale: float = 1.0
+    ) -> List[Dict[str, Any]]:
+        """
+        Detect faces trên một ảnh (được gom batch với các request khác), roi: box trước đó của session
+        pixel_scale: hệ số reduction khi decode ảnh (min_face_size tính theo độ phân giải gốc)
+        """
+        return await self.detector.submit((image, roi, pixel_scale))
+
+    async def embed(self, face_images: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+        """Extract embedding cho các face crop của một request"""
+        if not face_images:
+            return []
+        return await self.embedder.submit(face_images)
+
+    def _detect_batch(self, requests: List[Tuple[np.ndarray, Optional[Tuple[int, int, int, int]], float]]) -> List[List[Dict[str, Any]]]:
+        images = [image for image, _, _ in requests]
+        rois = [roi for _, roi, _ in requests]
+        pixel_scales = [pixel_scale for _, _, pixel_scale in requests]
+        return self.face_system.detect_faces_batch(images, rois, pixel_scales)
+
+    def _embed_batch(self, requests: List[List[np.ndarray]]) -> List[List[Optional[np.ndarray]]]:
+        # Làm phẳng crop của mọi request thành một tensor, sau đó tách lại theo request
+        flat = [face for faces in requests for face in faces]
+        embeddings = self.face_system.extract_embeddings_batch(flat)
+
+        results = []
+        offset = 0
+        for faces in requests:
+            results.append(embeddings[offset:offset + len(faces)])
+            offset += len(faces)
+        return results
+
+    @property
+    def queue_depth(self) -> int:
+        """Số request đang chờ gom batch (chưa vào inference executor)"""
+        return self.detector.queue_depth + self.embedder.queue_depth
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "detection": {**self.detector.stats, "queue_depth": self.detector.queue_depth},
+            "embedding": {**self.embedder.stats, "queue_depth": self.embedder.queue_depth},
+        }
+
+
+# Shared batcher - mọi endpoint dùng chung một hàng đợi mỗi worker
+face_batcher = FaceInferenceBatcher(face_system)
@@ -0,0 +1,120 @@
+import asyncio
+import functools
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class InferenceExecutor:
+    """
+    Thread pool riêng cho model inference (YOLO / FaceNet / DeepFace / SVM)
+    - Endpoint async await kết quả, event loop không bị block (WebSocket, heartbeat, quiz broadcast)
+    - Số thread và số job chạy đồng thời cấu hình qua settings
+    - Theo dõi queue depth + latency (chờ slot + chạy) để monitor / điều tiết tải
+    """
+
+    def __init__(self, max_workers: int, max_concurrency: int, latency_window: int = 512):
+        self.max_workers = max(1, max_workers)
+        self.max_concurrency = max(1, max_concurrency)
+
+        # Tạo lazy: gunicorn --preload fork worker sau khi import app,
+        # thread tạo trước fork sẽ không tồn tại trong worker
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        self._waiting = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._latencies: Deque[float] = deque(maxlen=max(1, latency_window))  # giây
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="inference"
+            )
+        return self._executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Chạy hàm CPU-bound trên inference pool và await kết quả"""
+        loop = asyncio.get_running_loop()
+        call = functools.partial(fn, *args, **kwargs)
+
+        semaphore = self._get_semaphore()
+        started = time.perf_counter()
+
+        # Nếu bị huỷ khi đang chờ slot thì exception đi thẳng ra ngoài, không giữ slot
+        self._waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._running += 1
+        try:
+            result = await loop.run_in_executor(self._get_executor(), call)
+            self._completed += 1
+            return result
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            self._running -= 1
+            semaphore.release()
+            self._latencies.append(time.perf_counter() - started)
+
+    @property
+    def queue_depth(self) -> int:
+        """Số job đang chờ slot + đang chạy"""
+        return self._waiting + self._running
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Latency (giây) theo percentile trên các job gần nhất, None nếu chưa có job"""
+        if not self._latencies:
+            return None
+        return float(np.percentile(np.fromiter(self._latencies, dtype=np.float64), percentile))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "waiting": self._waiting,
+            "running": self._running,
+            "queue_depth": self.queue_depth,
+            "completed": self._completed,
+            "failed": self._failed,
+            "latency_p50_ms": _to_ms(self.latency_percentile(50)),
+            "latency_p95_ms": _to_ms(self.latency_percentile(95)),
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+
+def _to_ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+# Global executor - mỗi worker một pool
+inference_executor = InferenceExecutor(
+    max_workers=settings.INFERENCE_MAX_WORKERS or (os.cpu_count() or 1),
+    max_concurrency=settings.INFERENCE_MAX_CONCURRENCY or settings.INFERENCE_MAX_WORKERS or (os.cpu_count() or 1),
+    latency_window=settings.INFERENCE_LATENCY_WINDOW,
+)
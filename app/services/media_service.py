@@ -14,21 +14,27 @@ def decode_base64_image_upload(base64_string: str):
     try:
         # Decode base64 string
         image_data = base64.b64decode(base64_string)
-        
-        # Kiểm tra kích thước file
-        if len(image_data) > settings.MAX_FILE_SIZE:
-            raise ValueError(f"File quá lớn. Tối đa {settings.MAX_FILE_SIZE / (1024*1024)}MB")
-        
-        # Xác định định dạng image
-        image_format = imghdr.what(None, h=image_data)
-        if not image_format or image_format not in settings.ALLOWED_FORMATS:
-            raise ValueError(f"Định dạng không được hỗ trợ. Chỉ chấp nhận: {', '.join(settings.ALLOWED_FORMATS)}")
-        
-        return image_data, image_format
-    
     except base64.binascii.Error:
         raise ValueError("Base64 string không hợp lệ")
 
+    return validate_image_upload(image_data)
+
+def validate_image_upload(image_data: bytes):
+    """
+    Kiểm tra kích thước + định dạng ảnh binary (upload multipart / websocket)
+    Trả về: (binary_data, format)
+    """
+    # Kiểm tra kích thước file
+    if len(image_data) > settings.MAX_FILE_SIZE:
+        raise ValueError(f"File quá lớn. Tối đa {settings.MAX_FILE_SIZE / (1024*1024)}MB")
+    
+    # Xác định định dạng image
+    image_format = imghdr.what(None, h=image_data)
+    if not image_format or image_format not in settings.ALLOWED_FORMATS:
+        raise ValueError(f"Định dạng không được hỗ trợ. Chỉ chấp nhận: {', '.join(settings.ALLOWED_FORMATS)}")
+    
+    return image_data, image_format
+
 def generate_unique_filename(original_filename: Optional[str], image_format: str) -> str:
     """
     Tạo filename unique cho static serving
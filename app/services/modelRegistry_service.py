@@ -0,0 +1,159 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import numpy as np
+
+logger = logging.getLogger("uvicorn.error")
+
+current_file = os.path.abspath(__file__)
+current_dir = os.path.dirname(current_file)
+ASSETS_DIR = os.path.join(current_dir, "..", "assets")
+SVM_MODEL_PATH = os.path.join(ASSETS_DIR, "svm_facenet_18.pkl")
+
+
+class ModelRegistry:
+    """
+    Registry dùng chung trong process:
+    - Mỗi model được load đúng MỘT lần (lazy, thread-safe), mọi nơi dùng chung reference
+    - warm_up() để load trước khi nhận request
+    - memory_report() báo cáo thời gian load và bộ nhớ ước tính của từng model
+    - inference_lock(name): lock gọi model cho model không thread-safe (Ultralytics YOLO predictor)
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._info: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._inference_locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        """Đăng ký loader cho model (chưa load)"""
+        with self._registry_lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+            self._inference_locks.setdefault(name, threading.Lock())
+
+    def inference_lock(self, name: str) -> threading.Lock:
+        """Lock để chỉ một thread inference dùng instance của model tại một thời điểm"""
+        if name not in self._inference_locks:
+            raise KeyError(f"Model '{name}' chưa được đăng ký")
+        return self._inference_locks[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def get(self, name: str) -> Any:
+        """Lấy model, load ở lần gọi đầu tiên"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            raise KeyError(f"Model '{name}' chưa được đăng ký")
+
+        with self._locks[name]:
+            if name not in self._models:
+                self._models[name] = self._load(name)
+        return self._models[name]
+
+    def reload(self, name: str) -> Any:
+        """Load lại model rồi thay reference (request đang chạy vẫn dùng bản cũ tới khi xong)"""
+        if name not in self._loaders:
+            raise KeyError(f"Model '{name}' chưa được đăng ký")
+
+        with self._locks[name]:
+            self._models[name] = self._load(name)
+        return self._models[name]
+
+    def _load(self, name: str) -> Any:
+        rss_before = _current_rss()
+        start_time = time.time()
+
+        model = self._loaders[name]()
+
+        load_time = time.time() - start_time
+        rss_after = _current_rss()
+        self._info[name] = {
+            "load_time": round(load_time, 3),
+            "rss_delta_bytes": (rss_after - rss_before) if rss_before is not None and rss_after is not None else None,
+            "estimated_bytes": _estimate_model_bytes(model),
+            "loaded_at": time.time(),
+        }
+        logger.info(f"Model '{name}' loaded in {load_time:.2f}s")
+        return model
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> None:
+        """Load trước các model (mặc định: tất cả model đã đăng ký)"""
+        for name in list(names or self._loaders.keys()):
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error(f"Model '{name}' warm-up failed: {e}")
+
+    def memory_report(self) -> Dict[str, Any]:
+        """Thông tin bộ nhớ theo từng model + RSS hiện tại của process"""
+        models = {}
+        for name in self._loaders:
+            info = self._info.get(name, {})
+            models[name] = {
+                "loaded": name in self._models,
+                **info,
+            }
+        return {
+            "process_rss_bytes": _current_rss(),
+            "models": models,
+        }
+
+
+def _current_rss() -> Optional[int]:
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss
+    except Exception:
+        return None
+
+
+def _estimate_model_bytes(model: Any) -> Optional[int]:
+    """Ước tính kích thước weights (torch / keras / sklearn), None nếu không xác định được"""
+    try:
+        # Ultralytics YOLO -> torch nn.Module
+        torch_module = getattr(model, "model", None)
+        if torch_module is not None and hasattr(torch_module, "parameters"):
+            return int(sum(p.numel() * p.element_size() for p in torch_module.parameters()))
+
+        # keras-facenet FaceNet -> keras Model
+        if torch_module is not None and hasattr(torch_module, "count_params"):
+            return int(torch_module.count_params() * 4)
+
+        # sklearn estimator -> tổng các numpy array thuộc tính
+        return int(sum(value.nbytes for value in vars(model).values() if isinstance(value, np.ndarray)))
+    except Exception:
+        return None
+
+
+def _load_face_detector():
+    from ultralytics import YOLO
+    return YOLO(os.path.join(ASSETS_DIR, "yolov11n-face.pt"))  # phát hiện khuôn mặt
+
+
+def _load_face_embedder():
+    from keras_facenet import FaceNet
+    return FaceNet()  # trích xuất embedding
+
+
+def _load_svm():
+    import joblib
+    from app.services.svmTraining_service import current_svm_path
+    return joblib.load(current_svm_path())  # phân loại ai là ai (dựa trên embedding)
+
+
+# Global registry - một bản model cho mỗi worker process
+model_registry = ModelRegistry()
+model_registry.register("face_detector", _load_face_detector)
+model_registry.register("face_embedder", _load_face_embedder)
+model_registry.register("svm", _load_svm)
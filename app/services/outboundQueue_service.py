@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable, Optional, Union
+
+from fastapi import WebSocket
+
+logger = logging.getLogger("uvicorn.error")
+
+Payload = Union[str, bytes]
+
+# Chính sách khi queue của client đầy (client chậm)
+POLICY_DROP = "drop"              # bỏ message mới
+POLICY_COALESCE = "coalesce"      # message có key thay message cùng key đang chờ, queue đầy thì bỏ message mới
+POLICY_DISCONNECT = "disconnect"  # ngắt client, client reconnect sẽ được sync lại state
+SLOW_CONSUMER_POLICIES = (POLICY_DROP, POLICY_COALESCE, POLICY_DISCONNECT)
+
+
+class _Frame:
+    __slots__ = ("payload", "key")
+
+    def __init__(self, payload: Payload, key: Optional[Hashable]):
+        self.payload = payload
+        self.key = key
+
+
+class OutboundQueue:
+    """
+    Hàng đợi gửi riêng cho một WebSocket + writer task:
+    - Broadcast chỉ enqueue (không await từng client), client chậm không chặn client khác
+    - Thứ tự message của một client được giữ nguyên
+    - Policy coalesce: message có key (vd. room count) thay thế message cùng key còn đang chờ gửi
+    - Queue đầy -> áp dụng slow-consumer policy; gửi lỗi / quá send_timeout -> on_dead
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_size: int,
+        policy: str,
+        send_timeout: float,
+        on_dead: Callable[[], Awaitable[None]],
+    ):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+
+        self.websocket = websocket
+        self.max_size = max(1, max_size)
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.on_dead = on_dead
+
+        self._frames: Deque[_Frame] = deque()
+        self._pending_keys: Dict[Hashable, _Frame] = {}
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self._closed = False
+
+        self.stats = {
+            "sent": 0,
+            "dropped": 0,
+            "coalesced": 0,
+        }
+
+    def start(self) -> None:
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._run())
+
+    def enqueue(self, payload: Payload, key: Optional[Hashable] = None) -> bool:
+        """Đưa message vào queue (không block), trả về False nếu message bị bỏ"""
+        if self._closed:
+            return False
+
+        if key is not None and self.policy == POLICY_COALESCE:
+            pending = self._pending_keys.get(key)
+            if pending is not None:
+                pending.payload = payload
+                self.stats["coalesced"] += 1
+                return True
+
+        if len(self._frames) >= self.max_size:
+            if self.policy == POLICY_DISCONNECT:
+                self._fail("send queue full")
+            else:
+                self.stats["dropped"] += 1
+            return False
+
+        frame = _Frame(payload, key)
+        self._frames.append(frame)
+        if key is not None:
+            self._pending_keys[key] = frame
+        self._ready.set()
+        return True
+
+    @property
+    def depth(self) -> int:
+        return len(self._frames)
+
+    async def _run(self) -> None:
+        while not self._closed:
+            if not self._frames:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            frame = self._frames.popleft()
+            if frame.key is not None:
+                self._pending_keys.pop(frame.key, None)
+
+            try:
+                if isinstance(frame.payload, bytes):
+                    send = self.websocket.send_bytes(frame.payload)
+                else:
+                    send = self.websocket.send_text(frame.payload)
+                await asyncio.wait_for(send, self.send_timeout or None)
+                self.stats["sent"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._fail(f"send failed: {e!r}")
+                return
+
+    def _fail(self, reason: str) -> None:
+        """Client chết / quá chậm: dừng nhận message và báo manager ngắt kết nối"""
+        if self._closed:
+            return
+        self._closed = True
+        self._frames.clear()
+        self._pending_keys.clear()
+        logger.warning(f"Closing slow or dead WebSocket: {reason}")
+        asyncio.create_task(self.on_dead())
+
+    def close(self) -> None:
+        self._closed = True
+        self._frames.clear()
+        self._pending_keys.clear()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        self._writer = None
+
@@ -6,6 +6,7 @@ from app.models.base import Nguoidung, Taikhoan
 from app.models.base import Vaitro
 from sqlalchemy import text, func, delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.embeddingChanges_service import publish_person_updated, publish_persons_removed
 
 def get_person_by_ms(db: Session,maso: str) -> Optional[Nguoidung]:
     """
@@ -26,6 +27,7 @@ async def bulk_delete_by_maso(db:AsyncSession, ids: List[str]) -> Optional[int]:
         result = await db.execute(delete_stmt)
 
         await db.commit()
+        publish_persons_removed(existing_ids)
 
         return result.rowcount
     except Exception as e:
@@ -45,6 +47,7 @@ def delete_person_by_maso(db:Session, ma_so: str) -> Optional[str]:
     try:
         db.delete(dbPerByMaso)
         db.commit()
+        publish_persons_removed([ma_so])
 
         return ma_so
     except:
@@ -71,6 +74,8 @@ def update_person_by_maso(db:Session,person_update : updatePersonData)->Optional
         db.add(dbPerByMaso)
         db.commit()
         db.refresh(dbPerByMaso)
+        if "ho_ten" in update_data:
+            publish_person_updated(dbPerByMaso.ma_so, ho_ten=dbPerByMaso.ho_ten)
 
         return dbPerByMaso
     except:
@@ -0,0 +1,189 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class SessionImageStore:
+    """
+    Ảnh verify thất bại (giáo viên xem lại qua request_image), giới hạn bộ nhớ:
+    - Lưu JPEG bytes (không phải base64 string, nhỏ hơn ~25%)
+    - Tổng byte trong RAM <= max_bytes, evict theo LRU
+    - Mỗi account tối đa max_per_account ảnh (bỏ ảnh cũ nhất)
+    - Ảnh quá ttl giây bị xoá
+    - spill_dir: ảnh bị evict khỏi RAM do hết budget được ghi ra disk cache (cũng có budget riêng)
+    """
+
+    def __init__(self, max_bytes: int, max_per_account: int, ttl: float,
+                 spill_dir: str = "", spill_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.max_per_account = max_per_account
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+
+        # session_id -> (account_id, created_at, jpeg bytes), thứ tự LRU
+        self._memory: "OrderedDict[str, Tuple[int, float, bytes]]" = OrderedDict()
+        # session_id -> (account_id, created_at, size) của ảnh đã spill ra disk
+        self._disk: "OrderedDict[str, Tuple[int, float, int]]" = OrderedDict()
+        self._by_account: Dict[int, "OrderedDict[str, None]"] = {}
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._swept_at = 0.0
+
+        self.stats = {
+            "stored": 0,
+            "evicted": 0,
+            "expired": 0,
+            "spilled": 0,
+        }
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._memory or session_id in self._disk
+
+    def put(self, session_id: str, account_id: int, data: bytes) -> None:
+        self._expire()
+        self.pop(session_id)
+
+        self._memory[session_id] = (account_id, time.time(), data)
+        self._memory_bytes += len(data)
+        self._by_account.setdefault(account_id, OrderedDict())[session_id] = None
+        self.stats["stored"] += 1
+
+        # Cap theo account: bỏ ảnh cũ nhất của chính account đó
+        sessions = self._by_account[account_id]
+        while self.max_per_account > 0 and len(sessions) > self.max_per_account:
+            oldest = next(iter(sessions))
+            self.pop(oldest)
+            self.stats["evicted"] += 1
+
+        # Budget RAM: evict LRU (spill ra disk nếu bật)
+        while self.max_bytes > 0 and self._memory_bytes > self.max_bytes and len(self._memory) > 1:
+            victim, (victim_account, created_at, victim_data) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(victim_data)
+            if not self._spill(victim, victim_account, created_at, victim_data):
+                self._forget(victim_account, victim)
+                self.stats["evicted"] += 1
+
+    def get(self, session_id: str) -> Optional[bytes]:
+        entry = self._memory.get(session_id)
+        if entry is not None:
+            if self._is_expired(entry[1]):
+                self.pop(session_id)
+                self.stats["expired"] += 1
+                return None
+            self._memory.move_to_end(session_id)
+            return entry[2]
+
+        disk_entry = self._disk.get(session_id)
+        if disk_entry is None:
+            return None
+        if self._is_expired(disk_entry[1]):
+            self.pop(session_id)
+            self.stats["expired"] += 1
+            return None
+        try:
+            with open(self._spill_path(session_id), "rb") as f:
+                return f.read()
+        except OSError:
+            self.pop(session_id)
+            return None
+
+    def pop(self, session_id: str) -> None:
+        entry = self._memory.pop(session_id, None)
+        if entry is not None:
+            self._memory_bytes -= len(entry[2])
+            self._forget(entry[0], session_id)
+
+        disk_entry = self._disk.pop(session_id, None)
+        if disk_entry is not None:
+            self._disk_bytes -= disk_entry[2]
+            self._remove_file(session_id)
+            self._forget(disk_entry[0], session_id)
+
+    def drop_account(self, account_id: int) -> None:
+        """Xoá toàn bộ ảnh của account (kết thúc session verify)"""
+        for session_id in list(self._by_account.get(account_id, ())):
+            self.pop(session_id)
+        self._by_account.pop(account_id, None)
+
+    def _forget(self, account_id: int, session_id: str) -> None:
+        sessions = self._by_account.get(account_id)
+        if sessions is not None:
+            sessions.pop(session_id, None)
+            if not sessions:
+                self._by_account.pop(account_id, None)
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl > 0 and time.time() - created_at > self.ttl
+
+    def _expire(self) -> None:
+        """Quét xoá ảnh hết hạn (tối đa mỗi phút một lần)"""
+        now = time.time()
+        if self.ttl <= 0 or now - self._swept_at < 60:
+            return
+        self._swept_at = now
+        for store in (self._memory, self._disk):
+            expired = [session_id for session_id, entry in store.items() if self._is_expired(entry[1])]
+            for session_id in expired:
+                self.pop(session_id)
+            self.stats["expired"] += len(expired)
+
+    def _spill_path(self, session_id: str) -> str:
+        # Thư mục riêng theo worker (pid lấy sau fork)
+        return os.path.join(self.spill_dir, str(os.getpid()), f"{session_id}.jpg")
+
+    def _remove_file(self, session_id: str) -> None:
+        try:
+            os.remove(self._spill_path(session_id))
+        except OSError:
+            pass
+
+    def _spill(self, session_id: str, account_id: int, created_at: float, data: bytes) -> bool:
+        if not self.spill_dir or self.spill_max_bytes <= 0 or len(data) > self.spill_max_bytes:
+            return False
+        path = self._spill_path(session_id)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+        except OSError as e:
+            logger.warning(f"Session image spill failed: {e}")
+            return False
+
+        self._disk[session_id] = (account_id, created_at, len(data))
+        self._disk_bytes += len(data)
+        self.stats["spilled"] += 1
+
+        while self._disk_bytes > self.spill_max_bytes:
+            victim, (victim_account, _, size) = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self._remove_file(victim)
+            self._forget(victim_account, victim)
+            self.stats["evicted"] += 1
+        return True
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "memory_images": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_images": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+            "accounts": len(self._by_account),
+        }
+
+
+# Global store - mỗi worker một store (ảnh nằm cùng worker với WebSocket của giáo viên)
+session_image_store = SessionImageStore(
+    max_bytes=settings.SESSION_IMAGE_MAX_BYTES,
+    max_per_account=settings.SESSION_IMAGE_MAX_PER_ACCOUNT,
+    ttl=settings.SESSION_IMAGE_TTL,
+    spill_dir=settings.SESSION_IMAGE_SPILL_DIR,
+    spill_max_bytes=settings.SESSION_IMAGE_SPILL_MAX_BYTES,
+)
@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows dev: không có file lock, chỉ chạy một worker
+    fcntl = None
+
+logger = logging.getLogger("uvicorn.error")
+
+STORE_FORMAT_VERSION = 1
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+KEEP_GENERATIONS = 2
+
+
+class SharedEmbeddingStore:
+    """
+    Snapshot embedding index dùng chung giữa các gunicorn worker qua memory-mapped file:
+    - Mỗi generation ghi ra thư mục riêng gen-<n>/ (mỗi mảng một file .npy)
+    - Con trỏ CURRENT (JSON: generation, thư mục, vị trí journal...) đổi bằng os.replace -> atomic
+    - Worker map read-only (np.load mmap_mode="r"): page cache dùng chung, RSS không tăng theo số worker,
+      worker mới khởi động không phải decode / build lại
+    - Giữ 2 generation gần nhất (double buffer); generation cũ bị xoá vẫn an toàn với worker đang map
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._current_stat: Optional[Tuple[int, int]] = None
+        self._current_meta: Optional[Dict[str, Any]] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def current(self) -> Optional[Dict[str, Any]]:
+        """Meta của generation hiện tại (chỉ đọc lại file khi CURRENT thay đổi)"""
+        if not self.enabled:
+            return None
+
+        path = os.path.join(self.directory, CURRENT_FILE)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        key = (stat.st_ino, stat.st_mtime_ns)
+        if key != self._current_stat:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Cannot read shared embedding store pointer: {e}")
+                return None
+            if meta.get("version") != STORE_FORMAT_VERSION:
+                return None
+            self._current_stat, self._current_meta = key, meta
+        return self._current_meta
+
+    def open(self, meta: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """Map read-only toàn bộ mảng của một generation"""
+        generation_dir = os.path.join(self.directory, meta["path"])
+        return {
+            name: np.load(os.path.join(generation_dir, f"{name}.npy"), mmap_mode="r", allow_pickle=False)
+            for name in meta["arrays"]
+        }
+
+    def publish(self, arrays: Dict[str, np.ndarray], **meta: Any) -> Optional[Dict[str, Any]]:
+        """
+        Ghi generation mới rồi chuyển CURRENT sang nó
+        Trả về meta của generation mới (None nếu lỗi)
+        """
+        if not self.enabled:
+            return None
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with self._locked():
+                previous = self.current()
+                generation = (previous["generation"] if previous else 0) + 1
+                name = f"gen-{generation:08d}"
+
+                tmp_dir = os.path.join(self.directory, f".{name}.{os.getpid()}.tmp")
+                os.makedirs(tmp_dir, exist_ok=True)
+                for array_name, array in arrays.items():
+                    np.save(os.path.join(tmp_dir, f"{array_name}.npy"), array, allow_pickle=False)
+                os.replace(tmp_dir, os.path.join(self.directory, name))
+
+                new_meta = {
+                    **meta,
+                    "version": STORE_FORMAT_VERSION,
+                    "generation": generation,
+                    "path": name,
+                    "arrays": sorted(arrays.keys()),
+                    "published_at": time.time(),
+                    "pid": os.getpid(),
+                }
+                tmp_current = os.path.join(self.directory, f".{CURRENT_FILE}.{os.getpid()}.tmp")
+                with open(tmp_current, "w", encoding="utf-8") as f:
+                    json.dump(new_meta, f)
+                os.replace(tmp_current, os.path.join(self.directory, CURRENT_FILE))
+
+                self._cleanup(generation)
+            return new_meta
+        except Exception as e:
+            logger.error(f"Failed to publish shared embedding snapshot: {e}")
+            return None
+
+    @contextmanager
+    def _locked(self):
+        """File lock giữa các worker khi ghi generation mới"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _cleanup(self, generation: int) -> None:
+        """Xoá các generation cũ hơn KEEP_GENERATIONS (file đang được map vẫn còn tới khi unmap)"""
+        for entry in os.listdir(self.directory):
+            if not entry.startswith("gen-"):
+                continue
+            try:
+                entry_generation = int(entry[4:])
+            except ValueError:
+                continue
+            if entry_generation <= generation - KEEP_GENERATIONS:
+                shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
@@ -0,0 +1,109 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.modelRegistry_service import model_registry
+from app.services.svmTraining_service import current_svm_path
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class SVMScorer:
+    """
+    Chấm điểm SVM cho cả batch embedding trong MỘT lần:
+    - Chỉ gọi predict_proba, label = class có xác suất cao nhất (không gọi predict riêng)
+    - Top-k bằng argpartition thay vì argsort toàn bộ class
+    - Thông tin theo class (classes_) cache theo phiên bản file SVM; file / version active đổi -> load lại model
+    """
+
+    def __init__(self, registry, model_name: str = "svm", model_path: Callable[[], str] = current_svm_path,
+                 check_interval: float = 5.0):
+        self.registry = registry
+        self.model_name = model_name
+        self.model_path = model_path
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._state: Optional[Tuple[Any, np.ndarray]] = None  # (model, classes)
+        self._version: Optional[Tuple[str, int, int]] = None
+        self._checked_at = 0.0
+
+    def _file_version(self) -> Optional[Tuple[str, int, int]]:
+        path = self.model_path()
+        try:
+            stat = os.stat(path)
+            return path, stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def refresh(self) -> None:
+        """Kiểm tra lại file SVM ngay ở lần score tiếp theo"""
+        self._checked_at = 0.0
+
+    def _model_state(self) -> Tuple[Any, np.ndarray]:
+        """(model, classes) hiện tại, kiểm tra file SVM tối đa mỗi check_interval giây"""
+        now = time.time()
+        if self._state is not None and now - self._checked_at < self.check_interval:
+            return self._state
+
+        with self._lock:
+            self._checked_at = now
+            version = self._file_version()
+
+            if self._state is None:
+                model = self.registry.get(self.model_name)
+            elif version != self._version:
+                logger.info(f"SVM file changed, reloading {version[0] if version else 'default model'}")
+                model = self.registry.reload(self.model_name)
+            else:
+                return self._state
+
+            self._version = version
+            self._state = (model, np.asarray(model.classes_))
+            return self._state
+
+    @property
+    def classes(self) -> np.ndarray:
+        return self._model_state()[1]
+
+    def score(self, embedding: np.ndarray, k: int = 3) -> Dict[str, Any]:
+        return self.score_batch([embedding], k)[0]
+
+    def score_batch(self, embeddings: List[np.ndarray], k: int = 3) -> List[Dict[str, Any]]:
+        """
+        Chấm điểm N embedding
+        Trả về mỗi embedding: {label, confidence, top_k: [(label, probability), ...]}
+        """
+        if not len(embeddings):
+            return []
+
+        model, classes = self._model_state()
+        batch = np.vstack([np.asarray(e, dtype=np.float64).reshape(1, -1) for e in embeddings])
+        probabilities = model.predict_proba(batch)
+
+        k = max(1, min(k, probabilities.shape[1]))
+        if k < probabilities.shape[1]:
+            top = np.argpartition(-probabilities, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(probabilities.shape[1]), (probabilities.shape[0], 1))
+        top_scores = np.take_along_axis(probabilities, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        return [
+            {
+                "label": classes[row_top[0]],
+                "confidence": float(row_scores[0]),
+                "top_k": [(classes[i], float(p)) for i, p in zip(row_top, row_scores)],
+            }
+            for row_top, row_scores in zip(top, top_scores)
+        ]
+
+
+# Global scorer - dùng chung SVM trong model_registry
+svm_scorer = SVMScorer(model_registry)
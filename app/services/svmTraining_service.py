@@ -0,0 +1,299 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services.modelRegistry_service import SVM_MODEL_PATH
+
+try:
+    import fcntl
+except ImportError:  # Windows dev: không có file lock
+    fcntl = None
+
+logger = logging.getLogger("uvicorn.error")
+
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+LAST_RESULT_FILE = "last_result.json"
+
+
+def current_svm_path() -> str:
+    """File SVM đang active: version trong SVM_MODEL_DIR/CURRENT, mặc định là model gốc trong assets"""
+    pointer = os.path.join(settings.SVM_MODEL_DIR, CURRENT_FILE)
+    try:
+        with open(pointer, "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except OSError:
+        return SVM_MODEL_PATH
+
+    path = os.path.join(settings.SVM_MODEL_DIR, name)
+    return path if name and os.path.exists(path) else SVM_MODEL_PATH
+
+
+def current_svm_metadata() -> Optional[Dict[str, Any]]:
+    path = current_svm_path()
+    if path == SVM_MODEL_PATH:
+        return None
+    try:
+        with open(f"{os.path.splitext(path)[0]}.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _holdout_split(labels: np.ndarray, ratio: float, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Chia train / holdout theo từng class (class chỉ có 1 mẫu luôn nằm ở train)"""
+    rng = np.random.default_rng(seed)
+    train_rows, holdout_rows = [], []
+    for label in np.unique(labels):
+        rows = rng.permutation(np.flatnonzero(labels == label))
+        n_holdout = int(round(len(rows) * ratio)) if len(rows) > 1 else 0
+        n_holdout = min(max(n_holdout, 1 if len(rows) > 1 else 0), len(rows) - 1)
+        holdout_rows.extend(rows[:n_holdout])
+        train_rows.extend(rows[n_holdout:])
+    return np.asarray(train_rows, dtype=np.int64), np.asarray(holdout_rows, dtype=np.int64)
+
+
+def _new_classifier():
+    from sklearn.svm import SVC
+    return SVC(kernel="linear", probability=True, class_weight="balanced")
+
+
+def train_svm_job(
+    output_dir: str,
+    holdout_ratio: float,
+    min_accuracy: float,
+    min_holdout: int,
+    min_confidence: float,
+    min_confident_rate: float,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Chạy trong process riêng: load embedding từ nhandien, train SVM, validate trên holdout,
+    ghi artifact có version (svm_<version>.pkl + .json). Không đổi CURRENT.
+    Không có đủ holdout (thường gặp: mỗi học sinh 1 embedding) -> không accept, không có model chưa validate
+    """
+    import joblib
+
+    from app.core.embedding_codec import decode_embedding
+    from app.db.base import db_handler
+    from app.services.embedding_service import get_all_embeddings, get_embedding_fingerprint
+
+    with db_handler.get_session("mysql") as db:
+        rows = get_all_embeddings(db)
+        fingerprint = get_embedding_fingerprint(db)
+
+    vectors, labels = [], []
+    for _, _, embedding_vector, ma_so, _ in rows:
+        try:
+            vector = decode_embedding(embedding_vector)
+        except Exception:
+            continue
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vectors.append(vector / norm)
+            labels.append(str(ma_so))
+
+    if len(set(labels)) < 2:
+        return {"accepted": False, "reason": "not enough identities", "fingerprint": list(fingerprint)}
+
+    X = np.vstack(vectors).astype(np.float64)
+    y = np.asarray(labels)
+
+    train_rows, holdout_rows = _holdout_split(y, holdout_ratio, seed)
+    result = {
+        "fingerprint": list(fingerprint),
+        "samples": int(len(y)),
+        "classes": int(len(np.unique(y))),
+        "holdout_samples": int(len(holdout_rows)),
+        "holdout_accuracy": None,
+        "holdout_confident_rate": None,
+    }
+    if not len(holdout_rows):
+        return {**result, "accepted": False, "reason": "no holdout"}
+    if len(holdout_rows) < min_holdout:
+        return {**result, "accepted": False, "reason": f"holdout {len(holdout_rows)} < {min_holdout} samples"}
+
+    candidate = _new_classifier().fit(X[train_rows], y[train_rows])
+    probabilities = candidate.predict_proba(X[holdout_rows])
+    best = np.argmax(probabilities, axis=1)
+    correct = candidate.classes_[best] == y[holdout_rows]
+    accuracy = float(np.mean(correct))
+    # Xác suất Platt phải dùng được: login bỏ prediction có confidence < ngưỡng
+    confident_rate = float(np.mean(correct & (probabilities[np.arange(len(best)), best] >= min_confidence)))
+    result.update(holdout_accuracy=accuracy, holdout_confident_rate=confident_rate)
+
+    if accuracy < min_accuracy:
+        return {**result, "accepted": False, "reason": f"holdout accuracy {accuracy:.3f} < {min_accuracy}"}
+    if confident_rate < min_confident_rate:
+        return {**result, "accepted": False,
+                "reason": f"holdout confident rate {confident_rate:.3f} < {min_confident_rate} (poor calibration)"}
+
+    # Đạt yêu cầu -> fit lại trên toàn bộ dữ liệu
+    model = _new_classifier().fit(X, y)
+
+    version = time.strftime("%Y%m%d%H%M%S") + f"_{os.getpid()}"
+    os.makedirs(output_dir, exist_ok=True)
+    model_path = os.path.join(output_dir, f"svm_{version}.pkl")
+    metadata = {**result, "version": version, "trained_at": time.time()}
+
+    tmp_path = f"{model_path}.tmp"
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, model_path)
+    with open(os.path.join(output_dir, f"svm_{version}.json"), "w", encoding="utf-8") as f:
+        json.dump(metadata, f)
+
+    return {**metadata, "accepted": True, "path": os.path.basename(model_path)}
+
+
+class SVMRetrainer:
+    """
+    Retrain SVM nền khi tập nhandien thay đổi:
+    - Định kỳ so fingerprint (số embedding, id lớn nhất) với metadata của model đang active
+    - Train trong process riêng (không chiếm GIL / event loop của worker)
+    - Chỉ một worker train tại một thời điểm (file lock)
+    - Chỉ model đạt holdout (đủ số mẫu, accuracy, calibration) -> đổi CURRENT bằng os.replace; mọi worker tự load lại qua SVMScorer
+    """
+
+    def __init__(self, model_dir: str, interval: float, holdout_ratio: float, min_accuracy: float, keep_versions: int,
+                 min_holdout: int = 1, min_confidence: float = 0.0, min_confident_rate: float = 0.0):
+        self.model_dir = model_dir
+        self.interval = interval
+        self.holdout_ratio = holdout_ratio
+        self.min_accuracy = min_accuracy
+        self.min_holdout = max(1, min_holdout)
+        self.min_confidence = min_confidence
+        self.min_confident_rate = min_confident_rate
+        self.keep_versions = keep_versions
+
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+
+    @property
+    def last_result(self) -> Optional[Dict[str, Any]]:
+        """Kết quả lần train gần nhất (của bất kỳ worker nào)"""
+        try:
+            with open(os.path.join(self.model_dir, LAST_RESULT_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_result(self, result: Dict[str, Any]) -> None:
+        tmp_path = os.path.join(self.model_dir, f".{LAST_RESULT_FILE}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, os.path.join(self.model_dir, LAST_RESULT_FILE))
+
+    def start(self) -> None:
+        """Bắt đầu vòng kiểm tra định kỳ (gọi trong startup của worker)"""
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._loop())
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.retrain(only_if_changed=True)
+            except Exception as e:
+                logger.error(f"SVM retraining failed: {e}")
+
+    def _is_up_to_date(self) -> bool:
+        """Model active (hoặc lần train bị reject gần nhất) đã dùng đúng tập embedding hiện tại"""
+        from app.db.base import db_handler
+        from app.services.embedding_service import get_embedding_fingerprint
+
+        with db_handler.get_session("mysql") as db:
+            fingerprint = list(get_embedding_fingerprint(db))
+
+        metadata = current_svm_metadata() or {}
+        last_result = self.last_result or {}
+        return fingerprint in (metadata.get("fingerprint"), last_result.get("fingerprint"))
+
+    async def retrain(self, only_if_changed: bool = False) -> Dict[str, Any]:
+        """Train model mới trong process riêng và hot swap nếu đạt holdout"""
+        if self._running:
+            return {"accepted": False, "reason": "retraining already running in this worker"}
+
+        os.makedirs(self.model_dir, exist_ok=True)
+        lock_file = open(os.path.join(self.model_dir, LOCK_FILE), "a")
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return {"accepted": False, "reason": "retraining already running in another worker"}
+
+            self._running = True
+            loop = asyncio.get_running_loop()
+            if only_if_changed and await loop.run_in_executor(None, self._is_up_to_date):
+                return {"accepted": False, "reason": "model is up to date"}
+
+            logger.info("Starting background SVM retraining")
+            # spawn: process con không thừa hưởng thread / model của worker
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                result = await loop.run_in_executor(
+                    pool, train_svm_job, self.model_dir, self.holdout_ratio, self.min_accuracy,
+                    self.min_holdout, self.min_confidence, self.min_confident_rate
+                )
+
+            if result.get("accepted"):
+                from app.services.svmScorer_service import svm_scorer
+
+                self._activate(result["path"])
+                svm_scorer.refresh()
+                logger.info(f"SVM version {result['version']} activated "
+                            f"(holdout accuracy={result['holdout_accuracy']}, classes={result['classes']})")
+            else:
+                logger.warning(f"SVM retraining rejected: {result.get('reason')}")
+
+            self._save_result(result)
+            return result
+        finally:
+            self._running = False
+            lock_file.close()
+
+    def _activate(self, model_name: str) -> None:
+        """Đổi CURRENT sang version mới (atomic) và dọn các version cũ"""
+        tmp_pointer = os.path.join(self.model_dir, f".{CURRENT_FILE}.{os.getpid()}.tmp")
+        with open(tmp_pointer, "w", encoding="utf-8") as f:
+            f.write(model_name)
+        os.replace(tmp_pointer, os.path.join(self.model_dir, CURRENT_FILE))
+
+        versions = sorted(entry for entry in os.listdir(self.model_dir)
+                          if entry.startswith("svm_") and entry.endswith(".pkl"))
+        for old in versions[:-self.keep_versions] if self.keep_versions > 0 else []:
+            if old == model_name:
+                continue
+            for path in (old, f"{os.path.splitext(old)[0]}.json"):
+                try:
+                    os.remove(os.path.join(self.model_dir, path))
+                except OSError:
+                    pass
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "active_model": os.path.basename(current_svm_path()),
+            "metadata": current_svm_metadata(),
+            "running": self._running,
+            "last_result": self.last_result,
+        }
+
+
+# Global retrainer - mỗi worker có vòng kiểm tra riêng, file lock đảm bảo chỉ một worker train
+svm_retrainer = SVMRetrainer(
+    model_dir=settings.SVM_MODEL_DIR,
+    interval=settings.SVM_RETRAIN_INTERVAL,
+    holdout_ratio=settings.SVM_RETRAIN_HOLDOUT,
+    min_accuracy=settings.SVM_RETRAIN_MIN_ACCURACY,
+    keep_versions=settings.SVM_KEEP_VERSIONS,
+    min_holdout=settings.SVM_RETRAIN_MIN_HOLDOUT,
+    min_confidence=settings.SVM_RETRAIN_MIN_CONFIDENCE,
+    min_confident_rate=settings.SVM_RETRAIN_MIN_CONFIDENT_RATE,
+)
@@ -0,0 +1,236 @@
+import asyncio
+import heapq
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+# notifier(account_id, interval) -> gửi verify_now cho học sinh (connection_service đăng ký),
+# trả về True nếu message thực sự được gửi / enqueue
+Notifier = Callable[[int, float], Awaitable[bool]]
+
+
+class VerificationScheduler:
+    """
+    Lịch verify phía server thay cho client polling /continuous-auth/status:
+    - Heap theo deadline (monotonic), mỗi account tối đa một deadline hợp lệ (entry cũ bị bỏ qua khi pop)
+    - Tới hạn -> gọi các notifier (push verify_now qua WebSocket) và tự đặt lại deadline
+      (client không phản hồi sẽ được nhắc lại sau một interval)
+    - Jitter ±jitter * interval để các học sinh vào phòng cùng lúc không verify đồng loạt
+    - max_misses lần liên tiếp không notifier nào gửi được (client offline, socket ở worker khác)
+      -> bỏ lịch của account, không nhắc lại mãi cho session không bao giờ end_session
+    """
+
+    def __init__(self, jitter: float, enabled: bool = True, max_misses: int = 0):
+        self.jitter = jitter
+        self.enabled = enabled
+        self.max_misses = max_misses
+
+        self._heap: List[Tuple[float, int, int]] = []          # (deadline, seq, account_id)
+        self._entries: Dict[int, Tuple[float, int, float]] = {}  # account_id -> (deadline, seq, interval)
+        self._seq = 0
+        self._misses: Dict[int, int] = {}                        # account_id -> số lần push liên tiếp không gửi được
+        self._notifiers: List[Notifier] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {
+            "scheduled": 0,
+            "pushed": 0,
+            "undelivered": 0,
+            "push_errors": 0,
+            "abandoned": 0,
+        }
+
+    def subscribe(self, notifier: Notifier) -> None:
+        self._notifiers.append(notifier)
+
+    def start(self) -> None:
+        """Bắt đầu vòng dispatch (gọi trong startup của worker)"""
+        if self.enabled and (self._task is None or self._task.done()):
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+    def _jittered(self, interval: float) -> float:
+        if self.jitter <= 0:
+            return interval
+        return max(0.0, interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def schedule(self, account_id: int, interval: float) -> None:
+        """Đặt (lại) deadline verify tiếp theo của account sau interval giây (có jitter)"""
+        if not self.enabled:
+            return
+        # Client vừa verify -> còn sống, đếm lại số lần push hụt
+        self._misses.pop(account_id, None)
+        self._arm(account_id, interval)
+
+    def _arm(self, account_id: int, interval: float) -> None:
+        deadline = time.monotonic() + self._jittered(interval)
+        self._seq += 1
+        self._entries[account_id] = (deadline, self._seq, interval)
+        heapq.heappush(self._heap, (deadline, self._seq, account_id))
+        self.stats["scheduled"] += 1
+
+        # Dọn entry cũ khi heap phình quá nhiều so với số account đang có lịch
+        if len(self._heap) > 4 * len(self._entries) + 64:
+            self._heap = [(d, seq, acc) for acc, (d, seq, _) in self._entries.items()]
+            heapq.heapify(self._heap)
+
+        # Deadline mới sớm hơn deadline đang chờ -> đánh thức vòng dispatch
+        if self._wakeup is not None and self._heap[0][1] == self._seq:
+            self._wakeup.set()
+
+    def cancel(self, account_id: int) -> None:
+        self._entries.pop(account_id, None)
+        self._misses.pop(account_id, None)
+
+    def next_due_in(self, account_id: int) -> Optional[float]:
+        """Số giây tới lần verify_now tiếp theo, None nếu account không có lịch"""
+        entry = self._entries.get(account_id)
+        return max(0.0, entry[0] - time.monotonic()) if entry else None
+
+    def _pop_due(self, now: float) -> List[Tuple[int, float]]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, seq, account_id = heapq.heappop(self._heap)
+            entry = self._entries.get(account_id)
+            if entry is None or entry[1] != seq:
+                continue  # đã bị reschedule / cancel
+            due.append((account_id, entry[2]))
+        return due
+
+    async def _loop(self) -> None:
+        while True:
+            timeout = max(0.0, self._heap[0][0] - time.monotonic()) if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            for account_id, interval in self._pop_due(time.monotonic()):
+                # Nhắc lại nếu client không verify; verify xong sẽ schedule lại theo fraud score mới
+                self._arm(account_id, interval)
+                seq = self._seq
+                if await self._notify(account_id, interval):
+                    self._misses.pop(account_id, None)
+                    continue
+
+                misses = self._misses.get(account_id, 0) + 1
+                self._misses[account_id] = misses
+                entry = self._entries.get(account_id)
+                # Bỏ lịch nếu quá số lần hụt và chưa ai schedule lại trong lúc chờ notifier
+                if self.max_misses > 0 and misses >= self.max_misses and entry is not None and entry[1] == seq:
+                    self.cancel(account_id)
+                    self.stats["abandoned"] += 1
+                    logger.info(f"verify_now undelivered {misses} times for account {account_id}, schedule dropped")
+
+    async def _notify(self, account_id: int, interval: float) -> bool:
+        """Gọi các notifier, True nếu ít nhất một notifier gửi được"""
+        delivered = False
+        for notifier in self._notifiers:
+            try:
+                delivered = bool(await notifier(account_id, interval)) or delivered
+            except Exception as e:
+                self.stats["push_errors"] += 1
+                logger.warning(f"verify_now push failed for account {account_id}: {e}")
+
+        self.stats["pushed" if delivered else "undelivered"] += 1
+        return delivered
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "max_misses": self.max_misses,
+            "pending": len(self._entries),
+            "heap_size": len(self._heap),
+        }
+
+
+class LoadAwareIntervalPolicy:
+    """
+    Giãn interval verify theo tải inference của worker:
+    - saturation = max(queue depth / queue_target, p95 latency / p95_target); <= 1 -> giữ nguyên
+    - Quá tải: interval * min(saturation, max_stretch), nhân theo trọng số của risk level
+      (clean / low giãn hết, medium giãn một nửa, high / critical giữ nhịp)
+    - Mọi quyết định được đếm theo risk level để theo dõi
+    """
+
+    STRETCH_WEIGHTS = {
+        "clean": 1.0,
+        "low": 1.0,
+        "medium": 0.5,
+        "high": 0.0,
+        "critical": 0.0,
+    }
+
+    def __init__(
+        self,
+        queue_depth: Callable[[], int],
+        latency_p95: Callable[[], Optional[float]],
+        queue_target: int,
+        p95_target_ms: float,
+        max_stretch: float,
+    ):
+        self.queue_depth = queue_depth
+        self.latency_p95 = latency_p95
+        self.queue_target = queue_target
+        self.p95_target = p95_target_ms / 1000.0
+        self.max_stretch = max(1.0, max_stretch)
+
+        self.last_load: Dict = {}
+        self.decisions: Dict[str, Dict[str, int]] = {}
+
+    def load(self) -> Dict:
+        """Queue depth, p95 latency hiện tại và hệ số saturation"""
+        depth = self.queue_depth()
+        p95 = self.latency_p95()
+
+        ratios = []
+        if self.queue_target > 0:
+            ratios.append(depth / self.queue_target)
+        if self.p95_target > 0 and p95 is not None:
+            ratios.append(p95 / self.p95_target)
+
+        return {
+            "queue_depth": depth,
+            "latency_p95_ms": round(p95 * 1000, 2) if p95 is not None else None,
+            "saturation": round(max(ratios, default=0.0), 3),
+        }
+
+    def interval(self, base_interval: float, risk_level: str) -> Tuple[float, Dict]:
+        """Interval thực tế cho risk level + thông tin quyết định (để lưu / trả về client)"""
+        load = self.load()
+        self.last_load = load
+
+        stretch = min(max(load["saturation"], 1.0), self.max_stretch)
+        factor = 1.0 + self.STRETCH_WEIGHTS.get(risk_level, 0.0) * (stretch - 1.0)
+        interval = base_interval * factor
+
+        action = "stretched" if factor > 1.0 else "kept"
+        counts = self.decisions.setdefault(risk_level, {"kept": 0, "stretched": 0})
+        counts[action] += 1
+
+        return interval, {**load, "base_interval": base_interval, "load_factor": round(factor, 3), "action": action}
+
+    def get_stats(self) -> Dict:
+        return {
+            "queue_target": self.queue_target,
+            "p95_target_ms": self.p95_target * 1000,
+            "max_stretch": self.max_stretch,
+            "last_load": self.last_load,
+            "decisions": self.decisions,
+        }
+
+
+# Global scheduler - session continuous auth nằm trong bộ nhớ worker nên lịch cũng theo worker
+verification_scheduler = VerificationScheduler(
+    jitter=settings.VERIFICATION_SCHEDULE_JITTER,
+    enabled=settings.VERIFICATION_PUSH_ENABLED,
+    max_misses=settings.VERIFICATION_PUSH_MAX_MISSES,
+)
@@ -8,6 +8,9 @@ export ENVIRONMENT=production
 echo "Initializing MySQL database..."
 python -m app.db.init_db
 
+echo "Migrating face embeddings to binary format..."
+python -m app.db.migrate_embeddings
+
 echo "Starting production server..."
 exec gunicorn app.main:app \
     --bind 0.0.0.0:$PORT \